@@ -0,0 +1,202 @@
+"""
+准入控制与限流
+
+- 按路径前缀给开销大的接口（完整索引、图片文件、健康检查）设并发上限，超出的请求在有界队列里排队，
+  队列已满或排队超时立即返回 503 + Retry-After，不让它们占满事件循环而拖慢 GET /dress/v1
+- 可选的按客户端 IP 令牌桶限流，超出返回 429 + Retry-After；桶按 LRU 淘汰，内存占用有上限
+
+多进程部署时每个进程各自计数
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from metrics import ADMISSION_QUEUE_WAIT, ADMISSION_REJECTED
+
+# 前缀=并发上限:排队上限，逗号分隔；以 / 结尾的按前缀匹配，否则只匹配该路径本身
+DEFAULT_ADMISSION_LIMITS = "/dress/v1/index/=4:16,/img/=16:64,/blob/=16:64,/health=4:16"
+
+
+def parse_limits(text: str) -> List[Tuple[str, int, int]]:
+    """解析 ADMISSION_LIMITS，返回 [(前缀, 并发上限, 排队上限)]，最长的前缀在前；none 表示关闭"""
+    if text.strip().lower() == "none":
+        return []
+    limits = []
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        prefix, _, value = item.strip().rpartition("=")
+        concurrency, _, queue = value.partition(":")
+        limits.append((prefix, int(concurrency), int(queue or 0)))
+    return sorted(limits, key=lambda limit: len(limit[0]), reverse=True)
+
+
+ADMISSION_LIMITS = parse_limits(os.environ.get("ADMISSION_LIMITS") or DEFAULT_ADMISSION_LIMITS)
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT") or 5)
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER") or 1)
+# 每个 IP 每秒补充的请求数，0 表示不限流；桶容量默认为两秒的量
+RATE_LIMIT = float(os.environ.get("RATE_LIMIT") or 0)
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST") or max(1.0, RATE_LIMIT * 2))
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get("RATE_LIMIT_MAX_CLIENTS") or 10000)
+# 监控抓取与就绪探针不参与限流
+RATE_LIMIT_EXEMPT = frozenset(
+    path.strip() for path in (os.environ.get("RATE_LIMIT_EXEMPT") or "/metrics,/health/ready").split(",") if path.strip())
+
+
+class ConcurrencyLimiter:
+    """
+    并发上限 + 有界等待队列，先到先得
+    释放时把名额直接交给队首的等待者，避免刚释放就被新请求插队
+    """
+    __slots__ = ("limit", "max_waiting", "active", "waiters")
+
+    def __init__(self, limit: int, max_waiting: int):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiters: deque = deque()
+
+    async def acquire(self, timeout: float) -> Optional[str]:
+        """取得名额返回 None，否则返回拒绝原因 queue_full / timeout"""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return None
+        if len(self.waiters) >= self.max_waiting:
+            return "queue_full"
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # 超时的同时恰好拿到了名额
+                return None
+            self._abandon(waiter)
+            return "timeout"
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._abandon(waiter)
+            raise
+        return None
+
+    def _abandon(self, waiter: asyncio.Future):
+        waiter.cancel()
+        try:
+            self.waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class RateLimiter:
+    """按 key（客户端 IP）的令牌桶，最多记录 max_clients 个，超出时淘汰最久未访问的"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def check(self, key: str) -> float:
+        """消耗一个令牌，允许时返回 0，否则返回还需等待的秒数"""
+        now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [self.burst, now]
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+
+async def _reject(send, status: int, retry_after: float, detail: str):
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """
+    纯 ASGI 中间件：先按客户端 IP 限流，再对命中 ADMISSION_LIMITS 前缀的请求做并发准入
+    等待队列绑定在事件循环上，事件循环变化时重新创建
+    """
+
+    def __init__(self, app, limits: List[Tuple[str, int, int]] = ADMISSION_LIMITS,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, rate: float = RATE_LIMIT,
+                 burst: float = RATE_LIMIT_BURST, max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.app = app
+        self.limits = limits
+        self.queue_timeout = queue_timeout
+        self.rate_limiter = RateLimiter(rate, burst, max_clients) if rate > 0 else None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._limiters: Dict[str, ConcurrencyLimiter] = {}
+        if limits:
+            logging.debug(f"准入控制: {limits}")
+
+    def _limiter(self, path: str) -> Tuple[Optional[str], Optional[ConcurrencyLimiter]]:
+        for prefix, concurrency, queue in self.limits:
+            if path == prefix or (prefix.endswith("/") and path.startswith(prefix)):
+                loop = asyncio.get_running_loop()
+                if loop is not self._loop:
+                    self._loop = loop
+                    self._limiters = {}
+                limiter = self._limiters.get(prefix)
+                if limiter is None:
+                    limiter = self._limiters[prefix] = ConcurrencyLimiter(concurrency, queue)
+                return prefix, limiter
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.rate_limiter is not None and scope["path"] not in RATE_LIMIT_EXEMPT:
+            client = scope.get("client")
+            wait = self.rate_limiter.check(client[0] if client else "")
+            if wait:
+                ADMISSION_REJECTED.labels("rate_limit", "rate_limited").inc()
+                await _reject(send, 429, wait, "请求过于频繁，请稍后再试")
+                return
+        prefix, limiter = self._limiter(scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        reason = await limiter.acquire(self.queue_timeout)
+        if reason is not None:
+            ADMISSION_REJECTED.labels(prefix, reason).inc()
+            await _reject(send, 503, ADMISSION_RETRY_AFTER, "服务繁忙，请稍后再试")
+            return
+        ADMISSION_QUEUE_WAIT.labels(prefix).observe(time.perf_counter() - start)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
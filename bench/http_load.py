@@ -0,0 +1,411 @@
+"""
+HTTP 服务端压测
+
+为每种运行模式准备一份独立的部署目录（复制服务端代码，本地模式附带合成的 Dress 仓库与预构建索引），
+上游（jsDelivr 镜像、连通性探测目标）替换为本机的桩服务器，不访问外网。
+服务端在独立进程中运行，同一事件循环里有监视任务记录事件循环延迟；
+压测端按给定并发逐个接口施压，报告 RPS、p50/p95/p99 延迟和该时段内的事件循环延迟，结果输出为 JSON
+
+    python bench/http_load.py --modes minimum,local --concurrency 32 --duration 10
+    python bench/http_load.py --baseline bench-http-before.json
+
+注意压测端本身也是 Python，极高 RPS 时瓶颈可能在压测端；事件循环延迟在服务端测量，不受影响
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+MODES = ("minimum", "local")
+# 名称 → (适用模式, 期望状态码)；路径在 _make_paths 中按夹具数据生成
+ENDPOINTS = {
+    "random": (MODES, 200),
+    "random_count": (MODES, 200),
+    "image_redirect": (MODES, 302),
+    "index_0": (MODES, 200),
+    "index_1": (MODES, 200),
+    "authors": (MODES, 200),
+    "author": (MODES, 200),
+    "health": (MODES, 200),
+    "img": (("local",), 200),
+    "blob": (("local",), 200),
+}
+LAG_INTERVAL = 0.01
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+# ---------------------------------------------------------------- 上游桩服务器
+
+def start_stub_upstream(files: Dict[str, bytes]) -> ThreadingHTTPServer:
+    """
+    在后台线程中运行的上游桩：路径以 files 中的文件名结尾时返回该文件（支持 ETag / 304），
+    其余路径一律 200，供连通性探测使用；files 可在运行中更新
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            name = self.path.rsplit("/", 1)[-1]
+            body = files.get(name)
+            etag = '"%s"' % hashlib.sha1(body).hexdigest() if body is not None else None
+            body = b"ok" if body is None else body
+            if etag and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            if etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_HEAD = do_GET
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---------------------------------------------------------------- 部署目录
+
+def prepare_deployment(path: Path, mode: str, fixture: Path, images: int, seed: int):
+    """
+    复制服务端代码与静态页面到 path；本地模式生成合成 Dress 仓库并用 build_index.py 构建索引，
+    最小化模式不带 Dress，启动时经桩服务器同步索引
+    """
+    path.mkdir(parents=True)
+    for source in ROOT.glob("*.py"):
+        shutil.copy2(source, path / source.name)
+    (path / "public").mkdir()
+    for source in (ROOT / "public").iterdir():
+        if source.is_file() and not source.name.startswith("index_"):
+            shutil.copy2(source, path / "public" / source.name)
+    if mode == "local":
+        from synthetic_repo import generate_repo
+        generate_repo(path / "Dress", images=images, authors=max(1, images // 20),
+                      commits=max(1, images // 5), renames=max(1, images // 20),
+                      touches=max(1, images // 10), seed=seed)
+        subprocess.run([sys.executable, "build_index.py"], cwd=path, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        fixture.mkdir(parents=True, exist_ok=True)
+        for name in ("index_0.json", "index_1.json"):
+            shutil.copy2(path / "public" / name, fixture / name)
+
+
+# ---------------------------------------------------------------- 服务端进程
+
+async def _monitor_lag(samples: List):
+    """每 LAG_INTERVAL 秒醒来一次，记录实际多睡的时间（事件循环被阻塞的时长）"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append((time.time(), loop.time() - start - LAG_INTERVAL))
+
+
+async def _serve(main, port: int, stub_url: str, lag_file: Path):
+    import uvicorn
+
+    # 连通性探测也指向桩服务器
+    main.connectivity_prober.targets = {name: [stub_url] for name in main.connectivity_prober.targets}
+    samples = []
+    monitor = asyncio.create_task(_monitor_lag(samples))
+    config = uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    try:
+        await uvicorn.Server(config).serve()
+    finally:
+        monitor.cancel()
+        lag_file.write_text(json.dumps(samples), encoding="utf-8")
+
+
+def run_server(args):
+    """--serve：在部署目录中导入 main 并运行，退出时写出事件循环延迟采样"""
+    sys.path.insert(0, os.getcwd())
+    # 在事件循环之外导入 main，导入期间的日志配置等不受事件循环影响
+    import main
+    try:
+        asyncio.run(_serve(main, args.port, args.stub, Path(args.lag_file)))
+    except KeyboardInterrupt:
+        # uvicorn 退出后会重新抛出收到的 SIGINT
+        pass
+
+
+def _server_env(mode: str, port: int, stub_url: str, deploy_dir: Path) -> Dict[str, str]:
+    env = dict(os.environ)
+    # main.py 只有在这七个变量都设置时才不读取 .env
+    env.update({
+        "API_KEY": "bench",
+        "PORTS": str(port),
+        "LOG_LEVEL": "WARNING",
+        "AUTO_SYNC": "false",
+        "AUTO_SYNC_TIME": "86400",
+        "FORCE_MINING": "true" if mode == "minimum" else "false",
+        "FORCE_REMOTE": "false",
+        "WORKERS": "1",
+        "REMOTE_MIRRORS": stub_url,
+        "REMOTE_CACHE_DIR": str(deploy_dir / "cache" / "remote"),
+        "DERIVATIVE_CACHE_DIR": str(deploy_dir / "cache" / "img"),
+    })
+    # 逐个接口测极限吞吐，默认关闭准入控制；显式设置 ADMISSION_LIMITS 时测开启后的表现
+    env.setdefault("ADMISSION_LIMITS", "none")
+    return env
+
+
+# ---------------------------------------------------------------- 压测端
+
+async def _wait_ready(client, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("服务端未能在时限内就绪")
+
+
+async def _make_paths(client, mode: str) -> Dict[str, List[str]]:
+    """按夹具数据生成各接口的请求路径，随机选取以免只命中同一条数据"""
+    authors = [a["name"] for a in (await client.get("/dress/v1/authors")).json()["authors"]]
+    paths = {
+        "random": ["/dress/v1"],
+        "random_count": ["/dress/v1?count=10"],
+        "image_redirect": ["/dress/v1/image"],
+        "index_0": ["/dress/v1/index/index_0.json"],
+        "index_1": ["/dress/v1/index/index_1.json"],
+        "authors": ["/dress/v1/authors"],
+        "author": [f"/dress/v1/author/{name}?limit=50" for name in authors],
+        "health": ["/health"],
+    }
+    if mode == "local":
+        items = (await client.get("/dress/v1?count=100")).json()
+        blobs = [item["img_url"][len(str(client.base_url)):] for item in items]
+        paths["blob"] = ["/" + p.lstrip("/") for p in blobs]
+        # /blob/<sha>/<path> → /img/<path>
+        paths["img"] = ["/img/" + p.lstrip("/").split("/", 2)[2] for p in blobs]
+    return paths
+
+
+async def drive(client, paths: List[str], expected: int, concurrency: int, duration: float, warmup: float) -> Dict:
+    """concurrency 个协程持续请求 duration 秒，返回延迟分布与时间窗口"""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = 0
+    recording = False
+    deadline = 0.0
+
+    async def worker():
+        nonlocal errors
+        rng = random.Random()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get(rng.choice(paths))
+                await response.aread()
+                status = response.status_code
+            except Exception:
+                status = 0
+            elapsed = time.perf_counter() - start
+            if recording:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status != expected:
+                    errors += 1
+
+    if warmup > 0:
+        deadline = time.perf_counter() + warmup
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    recording = True
+    window_start = time.time()
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+        "window": (window_start, time.time()),
+    }
+
+
+def _lag_stats(samples: List, window) -> Dict:
+    lags = sorted(lag for ts, lag in samples if window[0] <= ts <= window[1])
+    return {
+        "loop_lag_p50_ms": round(_percentile(lags, 0.50) * 1000, 3) if lags else None,
+        "loop_lag_p99_ms": round(_percentile(lags, 0.99) * 1000, 3) if lags else None,
+        "loop_lag_max_ms": round(lags[-1] * 1000, 3) if lags else None,
+    }
+
+
+async def _run_load(base_url: str, mode: str, endpoints: List[str], args) -> List[Dict]:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30,
+                                 headers={"Accept-Encoding": "gzip"}) as client:
+        await _wait_ready(client)
+        all_paths = await _make_paths(client, mode)
+        results = []
+        for name in endpoints:
+            if name not in all_paths:
+                continue
+            row = await drive(client, all_paths[name], ENDPOINTS[name][1],
+                              args.concurrency, args.duration, args.warmup)
+            results.append({"mode": mode, "endpoint": name, "concurrency": args.concurrency, **row})
+            print(f"{mode:>8} {name:>15}: {row['rps']:>8} rps, p50 {row['p50_ms']} ms, "
+                  f"p99 {row['p99_ms']} ms, {row['errors']} 个错误", file=sys.stderr)
+        return results
+
+
+def bench_mode(mode: str, tmp: Path, stub_url: str, args) -> List[Dict]:
+    deploy_dir = tmp / mode
+    prepare_deployment(deploy_dir, mode, tmp / "fixture", args.images, args.seed)
+    port = _free_port()
+    lag_file = deploy_dir / "loop_lag.json"
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", "--port", str(port), "--stub", stub_url, "--lag-file", str(lag_file)],
+        cwd=deploy_dir, env=_server_env(mode, port, stub_url, deploy_dir)
+    )
+    try:
+        endpoints = [e for e in args.endpoints.split(",") if e and mode in ENDPOINTS[e][0]]
+        results = asyncio.run(_run_load(f"http://127.0.0.1:{port}", mode, endpoints, args))
+    finally:
+        server.send_signal(signal.SIGINT)
+        server.wait(timeout=30)
+    samples = json.loads(lag_file.read_text(encoding="utf-8")) if lag_file.exists() else []
+    for row in results:
+        row.update(_lag_stats(samples, row.pop("window")))
+    return results
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> bool:
+    """对比 p99 延迟，超过基线 threshold 倍视为回归，返回是否没有回归"""
+    old = {(r["mode"], r["endpoint"]): r for r in baseline.get("results", [])}
+    ok = True
+    for row in current["results"]:
+        before = old.get((row["mode"], row["endpoint"]))
+        if before is None or not before.get("p99_ms") or row.get("p99_ms") is None:
+            continue
+        ratio = row["p99_ms"] / before["p99_ms"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        ok = ok and not flag
+        print(f"{row['mode']:>8} {row['endpoint']:>15}: p99 {before['p99_ms']} -> {row['p99_ms']} ms (x{ratio:.2f}), "
+              f"rps {before['rps']} -> {row['rps']} {flag}", file=sys.stderr)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 服务端压测")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10, help="每个接口的施压秒数")
+    parser.add_argument("--warmup", type=float, default=1, help="每个接口正式计时前的预热秒数")
+    parser.add_argument("--images", type=int, default=2000, help="夹具仓库的图片数量")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="部署目录的父目录，默认使用临时目录")
+    parser.add_argument("--output", help="结果 JSON 写入的文件，默认输出到标准输出")
+    parser.add_argument("--baseline", help="与之前的结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p99 超过基线该倍数时视为回归")
+    # 内部使用：在部署目录中运行服务端
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--stub", help=argparse.SUPPRESS)
+    parser.add_argument("--lag-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        run_server(args)
+        return
+
+    modes = [m for m in args.modes.split(",") if m]
+    unknown = [e for e in args.endpoints.split(",") if e and e not in ENDPOINTS]
+    if unknown or any(m not in MODES for m in modes):
+        parser.error(f"未知的模式或接口: {unknown or modes}")
+
+    report = {
+        "meta": {
+            "revision": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       capture_output=True, text=True).stdout.strip() or None,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "images": args.images,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        tmp = Path(tmp)
+        fixture = tmp / "fixture"
+        files: Dict[str, bytes] = {}
+        stub = start_stub_upstream(files)
+        stub_url = f"http://127.0.0.1:{stub.server_address[1]}/"
+        try:
+            # 最小化模式的索引来自本地模式构建的夹具，因此本地模式先运行
+            if "local" in modes:
+                report["results"].extend(bench_mode("local", tmp, stub_url, args))
+            else:
+                prepare_deployment(tmp / "fixture-build", "local", fixture, args.images, args.seed)
+            files.update({p.name: p.read_bytes() for p in fixture.glob("index_*.json")})
+            if "minimum" in modes:
+                report["results"].extend(bench_mode("minimum", tmp, stub_url, args))
+        finally:
+            stub.shutdown()
+
+    text = json.dumps(report, ensure_ascii=False, indent=4)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    if args.baseline and not compare(json.loads(Path(args.baseline).read_text(encoding="utf-8")), report, args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
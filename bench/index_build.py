@@ -0,0 +1,224 @@
+"""
+索引构建各阶段的基准测试
+
+在合成的 Dress 仓库上分别计时 build_index / build_index_by_author /
+convert_index_id_to_index_author / escape_hash_in_index，每个阶段在独立子进程中运行，
+报告墙钟时间、启动的子进程数和峰值 RSS，结果输出为 JSON，可用 --baseline 与旧结果对比
+
+    python bench/index_build.py --sizes 1000,10000 --output bench/results.json
+    python bench/index_build.py --sizes 1000,10000 --baseline bench/results.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+PHASES = (
+    "build_index",
+    "build_index_follow",
+    "build_index_by_author",
+    "convert_index_id_to_index_author",
+    "escape_hash_in_index",
+)
+
+
+def _isoformat(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def _load(path: Path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save(obj, path: Path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, default=_isoformat)
+
+
+def run_phase(phase: str, repo_path: Path, work_dir: Path) -> dict:
+    """在当前进程中执行一个阶段并计量；依赖前序阶段写在 work_dir 里的中间结果"""
+    from git import Repo
+    from dress_tools import (build_index, build_index_by_author,
+                             convert_index_id_to_index_author, escape_hash_in_index)
+
+    # 载入输入数据不计入计时
+    repo = Repo(repo_path)
+    if phase == "convert_index_id_to_index_author":
+        index_0 = _load(work_dir / "index_0.json")
+    elif phase == "escape_hash_in_index":
+        index_0 = _load(work_dir / "index_0.json")
+        index_1 = _load(work_dir / "index_1.json")
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    spawned = 0
+    original_init = subprocess.Popen.__init__
+
+    def counting_init(self, *args, **kwargs):
+        nonlocal spawned
+        spawned += 1
+        original_init(self, *args, **kwargs)
+
+    subprocess.Popen.__init__ = counting_init
+    start = time.perf_counter()
+    try:
+        if phase == "build_index":
+            output = asyncio.run(build_index(repo))
+        elif phase == "build_index_follow":
+            output = asyncio.run(build_index(repo, engine="follow"))
+        elif phase == "build_index_by_author":
+            output = asyncio.run(build_index_by_author(repo))
+        elif phase == "convert_index_id_to_index_author":
+            output = asyncio.run(convert_index_id_to_index_author(index_0))
+        elif phase == "escape_hash_in_index":
+            output = escape_hash_in_index(index_0, "url")
+            escape_hash_in_index(index_1, "author")
+        else:
+            raise ValueError(f"未知阶段: {phase}")
+        wall = time.perf_counter() - start
+    finally:
+        subprocess.Popen.__init__ = original_init
+
+    if phase == "build_index":
+        _save(output, work_dir / "index_0.json")
+    elif phase == "convert_index_id_to_index_author":
+        _save(output, work_dir / "index_1.json")
+    # Linux 上 ru_maxrss 单位为 KiB
+    return {
+        "phase": phase,
+        "wall_s": round(wall, 4),
+        "subprocesses": spawned,
+        "entries": len(output),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "input_peak_rss_kb": baseline_rss,
+        "children_peak_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def _run_phase_isolated(phase: str, repo_path: Path, work_dir: Path) -> dict:
+    """在新的解释器中运行阶段，保证峰值 RSS 只反映该阶段"""
+    result_path = work_dir / f"{phase}.result.json"
+    subprocess.run(
+        [sys.executable, __file__, "--phase", phase, "--repo", str(repo_path),
+         "--work", str(work_dir), "--result", str(result_path)],
+        check=True, stdout=subprocess.DEVNULL
+    )
+    return _load(result_path)
+
+
+def _git_version() -> str:
+    return subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip()
+
+
+def _revision() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """逐项对比墙钟时间，比值超过 threshold 的视为回归，返回是否没有回归"""
+    old = {(r["images"], r["phase"]): r for r in baseline.get("results", [])}
+    ok = True
+    for row in current["results"]:
+        before = old.get((row["images"], row["phase"]))
+        if before is None or not before["wall_s"]:
+            continue
+        ratio = row["wall_s"] / before["wall_s"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        ok = ok and not flag
+        print(f"{row['phase']:>36} @ {row['images']:>7}: {before['wall_s']:.3f}s -> {row['wall_s']:.3f}s "
+              f"(x{ratio:.2f}) {flag}", file=sys.stderr)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="索引构建各阶段的基准测试")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="图片数量，逗号分隔")
+    parser.add_argument("--authors-per-1k", type=int, default=50)
+    parser.add_argument("--phases", default=",".join(PHASES))
+    parser.add_argument("--follow-max", type=int, default=1000,
+                        help="逐文件 git log --follow 每张图片一个进程，超过该数量时跳过")
+    parser.add_argument("--workdir", help="合成仓库与中间结果的目录，默认使用临时目录")
+    parser.add_argument("--output", help="结果 JSON 写入的文件，默认输出到标准输出")
+    parser.add_argument("--baseline", help="与之前的结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=1.2, help="对比时超过该比值视为回归")
+    parser.add_argument("--seed", type=int, default=0)
+    # 内部使用：在子进程中运行单个阶段
+    parser.add_argument("--phase", help=argparse.SUPPRESS)
+    parser.add_argument("--repo", help=argparse.SUPPRESS)
+    parser.add_argument("--work", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING,
+                        format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
+    if args.phase:
+        _save(run_phase(args.phase, Path(args.repo), Path(args.work)), Path(args.result))
+        return
+
+    from synthetic_repo import generate_repo
+
+    phases = [p for p in args.phases.split(",") if p]
+    report = {
+        "meta": {
+            "revision": _revision(),
+            "python": platform.python_version(),
+            "git": _git_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "repos": [],
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+        for size in (int(s) for s in args.sizes.split(",") if s):
+            repo_path = Path(tmp) / f"dress-{size}"
+            work_dir = Path(tmp) / f"work-{size}"
+            work_dir.mkdir()
+            start = time.perf_counter()
+            repo_info = generate_repo(
+                repo_path, images=size, authors=max(1, size * args.authors_per_1k // 1000),
+                commits=max(1, size // 5), renames=max(1, size // 20), touches=max(1, size // 10),
+                seed=args.seed
+            )
+            repo_info["generate_s"] = round(time.perf_counter() - start, 4)
+            report["repos"].append(repo_info)
+            print(f"已生成 {size} 张图片的合成仓库 ({repo_info['generate_s']}s)", file=sys.stderr)
+
+            for phase in phases:
+                if phase == "build_index_follow" and size > args.follow_max:
+                    continue
+                # 后续阶段依赖 build_index / convert 的输出
+                if phase in ("convert_index_id_to_index_author", "escape_hash_in_index") \
+                        and not (work_dir / "index_0.json").exists():
+                    _run_phase_isolated("build_index", repo_path, work_dir)
+                if phase == "escape_hash_in_index" and not (work_dir / "index_1.json").exists():
+                    _run_phase_isolated("convert_index_id_to_index_author", repo_path, work_dir)
+                row = {"images": size, **_run_phase_isolated(phase, repo_path, work_dir)}
+                report["results"].append(row)
+                print(f"{phase:>36} @ {size:>7}: {row['wall_s']:.3f}s, {row['subprocesses']} 个子进程, "
+                      f"峰值 RSS {row['peak_rss_kb'] / 1024:.1f} MiB", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=4)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    if args.baseline:
+        if not compare(_load(Path(args.baseline)), report, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import gc
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from index_store import AuthorTable, Entry  # noqa: E402
+
+
+def deep_sizeof(obj, seen=None) -> int:
+    """递归统计对象占用的字节数，共享对象只计一次"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 index_0 原始结构与紧凑 Entry 表示的内存占用")
+    parser.add_argument("index", nargs="?", default="public/index_0.json")
+    args = parser.parse_args()
+
+    with open(args.index, "r", encoding="utf-8") as f:
+        index_0 = json.load(f)
+    count = len(index_0)
+    before = deep_sizeof(index_0)
+
+    table = AuthorTable()
+    entries = tuple(Entry.from_index_item(key, item, table) for key, item in index_0.items())
+    gc.collect()
+    seen = set()
+    after = deep_sizeof(entries, seen) + deep_sizeof(table, seen)
+
+    print(json.dumps({
+        "entries": count,
+        "authors": len(table),
+        "before_bytes": before,
+        "before_bytes_per_entry": round(before / count, 1),
+        "after_bytes": after,
+        "after_bytes_per_entry": round(after / count, 1),
+        "ratio": round(after / before, 3),
+    }, ensure_ascii=False, indent=4))
+
+
+if __name__ == "__main__":
+    main()
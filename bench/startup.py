@@ -0,0 +1,242 @@
+"""
+服务端启动耗时
+
+在独立的部署目录中以 python main.py 启动服务，计量从启动进程到开始响应 /health、
+到 /dress/v1 能从磁盘上的索引返回图片的时间，以及进程内记录的 dress_startup_duration_seconds。
+远端镜像指向一个只接受连接、从不回应的黑洞端口：启动路径上若有任何网络等待都会直接体现在耗时里。
+另外检查导入 main 时是否加载了只有构建索引才需要的模块（tqdm、GitPython、colorama）
+
+    python bench/startup.py --images 2000 --budget 5
+    python bench/startup.py --baseline bench-startup-before.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from http_load import ROOT, _free_port, prepare_deployment
+
+MODES = ("local", "minimum")
+BUILDER_MODULES = ("tqdm", "git", "colorama")
+
+
+def start_black_hole() -> socket.socket:
+    """接受连接但从不回应，模拟不可达的上游"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(128)
+    held = []
+
+    def accept():
+        while True:
+            try:
+                held.append(server.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server
+
+
+def _server_env(mode: str, port: int, black_hole: str, deploy_dir: Path) -> Dict[str, str]:
+    env = dict(os.environ)
+    # main.py 只有在这七个变量都设置时才不读取 .env
+    env.update({
+        "API_KEY": "bench",
+        "PORTS": str(port),
+        "LOG_LEVEL": "WARNING",
+        "AUTO_SYNC": "true",
+        "AUTO_SYNC_TIME": "86400",
+        "FORCE_MINING": "true" if mode == "minimum" else "false",
+        "FORCE_REMOTE": "false",
+        "WORKERS": "1",
+        "REMOTE_MIRRORS": black_hole,
+        "REMOTE_CACHE_DIR": str(deploy_dir / "cache" / "remote"),
+        "DERIVATIVE_CACHE_DIR": str(deploy_dir / "cache" / "img"),
+    })
+    return env
+
+
+def _get(port: int, path: str, timeout: float = 1) -> Optional[bytes]:
+    """最简单的 HTTP/1.0 GET，返回 200 的响应体，其余情况返回 None；不引入客户端库的导入开销"""
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=timeout) as conn:
+            conn.sendall(f"GET {path} HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n".encode())
+            data = b""
+            while chunk := conn.recv(65536):
+                data += chunk
+    except OSError:
+        return None
+    head, _, body = data.partition(b"\r\n\r\n")
+    return body if head.split(b" ", 2)[1:2] == [b"200"] else None
+
+
+def _startup_metric(body: Optional[bytes]) -> Optional[float]:
+    for line in (body or b"").decode().splitlines():
+        if line.startswith("dress_startup_duration_seconds "):
+            return float(line.split()[1])
+    return None
+
+
+def measure_once(deploy_dir: Path, env: Dict[str, str], port: int, timeout: float) -> Dict:
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "main.py"], cwd=deploy_dir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"bind_s": None, "serve_s": None, "in_process_s": None}
+    try:
+        deadline = start + timeout
+        while time.perf_counter() < deadline and server.poll() is None:
+            if result["bind_s"] is None and _get(port, "/health") is not None:
+                result["bind_s"] = round(time.perf_counter() - start, 4)
+            if result["bind_s"] is not None and _get(port, "/dress/v1") is not None:
+                result["serve_s"] = round(time.perf_counter() - start, 4)
+                break
+            time.sleep(0.01)
+        result["in_process_s"] = _startup_metric(_get(port, "/metrics"))
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return result
+
+
+def builder_modules_on_import(deploy_dir: Path, env: Dict[str, str]) -> List[str]:
+    """导入 main 后已加载的构建期模块"""
+    code = f"import json, sys; import main; print(json.dumps([m for m in {BUILDER_MODULES!r} if m in sys.modules]))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=deploy_dir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_mode(mode: str, tmp: Path, black_hole: str, args) -> Dict:
+    deploy_dir = tmp / mode
+    fixture = tmp / "fixture"
+    if mode == "local":
+        prepare_deployment(deploy_dir, "local", fixture, args.images, args.seed)
+    else:
+        if not fixture.exists():
+            prepare_deployment(tmp / "fixture-build", "local", fixture, args.images, args.seed)
+        prepare_deployment(deploy_dir, "minimum", fixture, args.images, args.seed)
+        # 最小化模式从远端索引缓存启动
+        cache_dir = deploy_dir / "cache" / "remote"
+        cache_dir.mkdir(parents=True)
+        for source in fixture.glob("index_*.json"):
+            shutil.copy2(source, cache_dir / source.name)
+    port = _free_port()
+    env = _server_env(mode, port, black_hole, deploy_dir)
+    runs = [measure_once(deploy_dir, env, port, args.timeout) for _ in range(args.repeat)]
+
+    def median(key):
+        values = [run[key] for run in runs if run[key] is not None]
+        return round(statistics.median(values), 4) if len(values) == len(runs) else None
+
+    row = {
+        "mode": mode,
+        "images": args.images,
+        "bind_s": median("bind_s"),
+        "serve_s": median("serve_s"),
+        "in_process_s": median("in_process_s"),
+        "builder_modules": builder_modules_on_import(deploy_dir, env),
+        "runs": runs,
+    }
+    print(f"{mode:>8}: 开始响应 {row['bind_s']}s，可返回图片 {row['serve_s']}s，进程内 {row['in_process_s']}s，"
+          f"构建期模块 {row['builder_modules'] or '无'}", file=sys.stderr)
+    return row
+
+
+def check_budget(report: Dict, budget: float) -> bool:
+    ok = True
+    for row in report["results"]:
+        if row["serve_s"] is None or row["serve_s"] > budget:
+            print(f"{row['mode']:>8}: 未能在 {budget}s 内开始服务", file=sys.stderr)
+            ok = False
+        if row["builder_modules"]:
+            print(f"{row['mode']:>8}: 导入 main 时加载了 {row['builder_modules']}", file=sys.stderr)
+            ok = False
+    return ok
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> bool:
+    """对比可返回图片的耗时，超过基线 threshold 倍视为回归，返回是否没有回归"""
+    old = {r["mode"]: r for r in baseline.get("results", [])}
+    ok = True
+    for row in current["results"]:
+        before = old.get(row["mode"])
+        if before is None or not before.get("serve_s") or row.get("serve_s") is None:
+            continue
+        ratio = row["serve_s"] / before["serve_s"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        ok = ok and not flag
+        print(f"{row['mode']:>8}: {before['serve_s']:.3f}s -> {row['serve_s']:.3f}s (x{ratio:.2f}) {flag}",
+              file=sys.stderr)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务端启动耗时")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--images", type=int, default=2000, help="夹具仓库的图片数量")
+    parser.add_argument("--repeat", type=int, default=3, help="每种模式启动的次数，取中位数")
+    parser.add_argument("--timeout", type=float, default=60, help="单次启动的最长等待秒数")
+    parser.add_argument("--budget", type=float, default=5, help="可返回图片的耗时超过该秒数时失败")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="部署目录的父目录，默认使用临时目录")
+    parser.add_argument("--output", help="结果 JSON 写入的文件，默认输出到标准输出")
+    parser.add_argument("--baseline", help="与之前的结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=1.2, help="耗时超过基线该倍数时视为回归")
+    args = parser.parse_args()
+
+    modes = [m for m in args.modes.split(",") if m]
+    if any(m not in MODES for m in modes):
+        parser.error(f"未知的模式: {modes}")
+
+    report = {
+        "meta": {
+            "revision": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       capture_output=True, text=True).stdout.strip() or None,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "images": args.images,
+            "repeat": args.repeat,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": [],
+    }
+    black_hole = start_black_hole()
+    try:
+        with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+            for mode in modes:
+                report["results"].append(
+                    bench_mode(mode, Path(tmp), f"http://127.0.0.1:{black_hole.getsockname()[1]}/", args))
+    finally:
+        black_hole.close()
+
+    text = json.dumps(report, ensure_ascii=False, indent=4)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    ok = check_budget(report, args.budget)
+    if args.baseline:
+        ok = compare(json.loads(Path(args.baseline).read_text(encoding="utf-8")), report, args.threshold) and ok
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import random
+import string
+import subprocess
+from pathlib import Path
+from typing import Dict, List
+
+# 与 Dress 相同的维护者账号，convert_index_id_to_index_author 会跳过它
+MAINTAINER = ("CuteDress", "cutedress@example.com")
+EXTENSIONS = (".jpg", ".jpg", ".jpg", ".png", ".jpeg", ".webp", ".JPG")
+START_TIME = 1577808000  # 2020-01-01T00:00:00+08:00
+
+
+def _author(i: int):
+    return (f"author{i:04d}", f"author{i:04d}@example.com")
+
+
+def _data(payload: bytes) -> bytes:
+    return b"data %d\n" % len(payload) + payload + b"\n"
+
+
+def generate_repo(path, images: int = 1000, authors: int = 50, commits: int = 200, renames: int = 50,
+                  touches: int = 100, hash_ratio: float = 0.05, seed: int = 0) -> Dict:
+    """
+    用 git fast-import 生成一个结构类似 Dress 的本地仓库并检出工作区
+    - images 张图片分散在 commits 个提交中添加，每个提交随机一位作者
+    - renames 次重命名（换目录，模拟整理归档），touches 次维护者修改已有图片
+    - hash_ratio 比例的图片放在以 '#' 开头的目录下，对应线上的 %23/... 路径
+    返回生成参数与实际的提交数
+    """
+    rng = random.Random(seed)
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    subprocess.run(["git", "init", "-q"], cwd=path, check=True)
+    subprocess.run(["git", "symbolic-ref", "HEAD", "refs/heads/master"], cwd=path, check=True)
+
+    live: List[str] = []
+    stream = []
+    mark = 0
+    timestamp = START_TIME
+    commits = max(1, commits)
+    per_commit = max(1, images // commits)
+    added = 0
+    pending_renames = renames
+    pending_touches = touches
+
+    def commit(who, message: str, ops: List[bytes]):
+        nonlocal mark, timestamp
+        mark += 1
+        timestamp += rng.randint(60, 86400)
+        ident = f"{who[0]} <{who[1]}> {timestamp} +0800".encode("utf-8")
+        stream.append(b"commit refs/heads/master\nmark :%d\n" % mark)
+        stream.append(b"author " + ident + b"\ncommitter " + ident + b"\n")
+        stream.append(_data(message.encode("utf-8")))
+        if mark > 1:
+            stream.append(b"from :%d\n" % (mark - 1))
+        stream.extend(ops)
+        stream.append(b"\n")
+
+    while added < images or pending_renames > 0 or pending_touches > 0:
+        if added < images:
+            who = _author(rng.randrange(authors))
+            ops = []
+            model = "".join(rng.choices(string.ascii_letters, k=8))
+            folder = f"#/{model}" if rng.random() < hash_ratio else f"{model[0].upper()}/{model}"
+            for _ in range(min(per_commit, images - added)):
+                file_path = f"{folder}/IMG_{added:07d}{rng.choice(EXTENSIONS)}"
+                ops.append(b"M 100644 inline " + file_path.encode("utf-8") + b"\n")
+                ops.append(_data(b"\xff\xd8\xff\xe0" + file_path.encode("utf-8")))
+                live.append(file_path)
+                added += 1
+            commit(who, f"add {len(ops) // 2} images", ops)
+        if pending_renames > 0 and live and (added >= images or rng.random() < renames / commits):
+            i = rng.randrange(len(live))
+            old = live[i]
+            new = f"Archive/{old}"
+            live[i] = new
+            commit(MAINTAINER if rng.random() < 0.5 else _author(rng.randrange(authors)), f"move {old}",
+                   [b"R " + old.encode("utf-8") + b" " + new.encode("utf-8") + b"\n"])
+            pending_renames -= 1
+        if pending_touches > 0 and live and (added >= images or rng.random() < touches / commits):
+            target = rng.choice(live)
+            commit(MAINTAINER, f"update {target}", [
+                b"M 100644 inline " + target.encode("utf-8") + b"\n",
+                _data(b"\xff\xd8\xff\xe1" + target.encode("utf-8") + b"%d" % mark),
+            ])
+            pending_touches -= 1
+
+    subprocess.run(["git", "fast-import", "--quiet"], cwd=path, input=b"".join(stream), check=True)
+    subprocess.run(["git", "reset", "-q", "--hard", "master"], cwd=path, check=True)
+    return {
+        "images": images, "authors": authors, "commits": mark, "renames": renames,
+        "touches": touches, "hash_ratio": hash_ratio, "seed": seed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成结构类似 Dress 的合成 git 仓库")
+    parser.add_argument("path")
+    parser.add_argument("--images", type=int, default=1000)
+    parser.add_argument("--authors", type=int, default=50)
+    parser.add_argument("--commits", type=int, default=200, help="添加图片的提交数（不含重命名与修改提交）")
+    parser.add_argument("--renames", type=int, default=50)
+    parser.add_argument("--touches", type=int, default=100, help="维护者修改已有图片的次数")
+    parser.add_argument("--hash-ratio", type=float, default=0.05, help="放在 '#' 目录下的图片比例")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    info = generate_repo(args.path, args.images, args.authors, args.commits, args.renames,
+                         args.touches, args.hash_ratio, args.seed)
+    print(json.dumps(info, ensure_ascii=False, indent=4))
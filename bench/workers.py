@@ -0,0 +1,194 @@
+"""
+多进程部署的扩展性
+
+在同一份本地模式部署（合成仓库 + 预构建索引）上依次以 WORKERS=1、2、4… 启动 python main.py，计量：
+- 所有工作进程就绪的耗时（连续多次新建连接的 /health/ready 都返回 200）
+- 就绪后每个进程的首个 /dress/v1/author 请求的延迟：非主进程切换到共享索引时若需要解析 index_1，会体现在这里
+- 随机接口与作者分页接口在给定并发下的 RPS 与 p50/p99 延迟，以及相对 WORKERS=1 的倍数
+- 全部进程的 PSS 之和（共享的页缓存按进程数均摊，仅 Linux）
+
+远端镜像指向黑洞端口，不访问外网。压测端本身是单个 Python 进程，核数较多时瓶颈可能在压测端
+
+    python bench/workers.py --workers 1,2,4 --concurrency 64 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from http_load import ROOT, _free_port, _percentile, drive, prepare_deployment
+from startup import _server_env, start_black_hole
+
+ENDPOINTS = ("random", "author")
+
+
+def _process_tree(pid: int) -> List[int]:
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            pending += [int(child) for child in Path(f"/proc/{current}/task/{current}/children").read_text().split()]
+        except OSError:
+            pass
+    return pids
+
+
+def total_pss_mb(pid: int) -> Optional[float]:
+    """进程树的 PSS 之和（MiB），无法读取 /proc 时返回 None"""
+    total = 0
+    for current in _process_tree(pid):
+        try:
+            for line in Path(f"/proc/{current}/smaps_rollup").read_text().splitlines():
+                if line.startswith("Pss:"):
+                    total += int(line.split()[1])
+        except OSError:
+            return None
+    return round(total / 1024, 1)
+
+
+async def _wait_all_ready(base_url: str, workers: int, timeout: float) -> float:
+    """连续 8 × workers 次新建连接的 /health/ready 都返回 200 才算全部进程就绪，返回耗时"""
+    import httpx
+
+    start = time.perf_counter()
+    streak = 0
+    while streak < 8 * workers:
+        if time.perf_counter() - start > timeout:
+            raise RuntimeError("服务端未能在时限内就绪")
+        try:
+            async with httpx.AsyncClient(base_url=base_url, timeout=5) as client:
+                ok = (await client.get("/health/ready")).status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        streak = streak + 1 if ok else 0
+        if not ok:
+            await asyncio.sleep(0.05)
+    return time.perf_counter() - start
+
+
+async def _first_author_requests(base_url: str, paths: List[str], count: int) -> List[float]:
+    """并发发出 count 个新建连接的作者请求，分散到各个进程上，返回各自的延迟"""
+    import httpx
+
+    async def one(path: str) -> float:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            start = time.perf_counter()
+            response = await client.get(path)
+            await response.aread()
+            return time.perf_counter() - start
+
+    return sorted(await asyncio.gather(*(one(random.choice(paths)) for _ in range(count))))
+
+
+async def _measure(base_url: str, workers: int, args) -> Dict:
+    import httpx
+
+    ready_s = await _wait_all_ready(base_url, workers, args.timeout)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        authors = [a["name"] for a in (await client.get("/dress/v1/authors")).json()["authors"]]
+    paths = {"random": ["/dress/v1"], "author": [f"/dress/v1/author/{name}?limit=50" for name in authors]}
+    first = await _first_author_requests(base_url, paths["author"], 4 * workers)
+    row = {
+        "workers": workers,
+        "ready_s": round(ready_s, 3),
+        "first_author_p50_ms": round(_percentile(first, 0.50) * 1000, 3),
+        "first_author_max_ms": round(first[-1] * 1000, 3),
+    }
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        for name in ENDPOINTS:
+            result = await drive(client, paths[name], 200, args.concurrency, args.duration, args.warmup)
+            row[name] = {key: result[key] for key in ("rps", "p50_ms", "p99_ms", "errors")}
+    return row
+
+
+def bench_workers(deploy_dir: Path, workers: int, black_hole: str, args) -> Dict:
+    # 每轮从空的共享目录开始，包含主进程首次写出共享索引的耗时
+    shutil.rmtree(deploy_dir / "cache", ignore_errors=True)
+    port = _free_port()
+    env = _server_env("local", port, black_hole, deploy_dir)
+    env.update({"WORKERS": str(workers), "AUTO_SYNC": "false", "ADMISSION_LIMITS": "none"})
+    server = subprocess.Popen([sys.executable, "main.py"], cwd=deploy_dir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        row = asyncio.run(_measure(f"http://127.0.0.1:{port}", workers, args))
+        row["pss_mb"] = total_pss_mb(server.pid)
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    print(f"WORKERS={workers}: 就绪 {row['ready_s']}s，首个作者请求 p50 {row['first_author_p50_ms']} ms / "
+          f"最大 {row['first_author_max_ms']} ms，随机 {row['random']['rps']} rps，作者 {row['author']['rps']} rps，"
+          f"PSS {row['pss_mb']} MiB", file=sys.stderr)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程部署的扩展性")
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的工作进程数")
+    parser.add_argument("--images", type=int, default=2000, help="夹具仓库的图片数量")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10, help="每个接口的施压秒数")
+    parser.add_argument("--warmup", type=float, default=1, help="每个接口正式计时前的预热秒数")
+    parser.add_argument("--timeout", type=float, default=60, help="等待全部进程就绪的最长秒数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="部署目录的父目录，默认使用临时目录")
+    parser.add_argument("--output", help="结果 JSON 写入的文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    counts = [int(n) for n in args.workers.split(",") if n]
+    report = {
+        "meta": {
+            "revision": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       capture_output=True, text=True).stdout.strip() or None,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "images": args.images,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": [],
+    }
+    black_hole = start_black_hole()
+    try:
+        with tempfile.TemporaryDirectory(dir=args.workdir) as tmp:
+            deploy_dir = Path(tmp) / "local"
+            prepare_deployment(deploy_dir, "local", Path(tmp) / "fixture", args.images, args.seed)
+            for workers in counts:
+                report["results"].append(
+                    bench_workers(deploy_dir, workers, f"http://127.0.0.1:{black_hole.getsockname()[1]}/", args))
+    finally:
+        black_hole.close()
+
+    base = report["results"][0] if report["results"] else None
+    for row in report["results"]:
+        row["speedup"] = {
+            name: round(row[name]["rps"] / base[name]["rps"], 2) if base[name]["rps"] else None for name in ENDPOINTS
+        }
+
+    text = json.dumps(report, ensure_ascii=False, indent=4)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
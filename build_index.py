@@ -4,7 +4,8 @@ import sys
 from git import Repo
 from tqdm import tqdm
 import colorama
-from dress_tools import escape_hash_in_index,build_index,convert_index_id_to_index_author
+from dress_tools import escape_hash_in_index,build_index,convert_index_id_to_index_author,get_head_sha,write_index_meta,write_index_ndjson,write_json_atomic
+from index_binary import write_binary_index
 import logging
 
 logging.basicConfig(level=logging.DEBUG,
@@ -26,15 +27,34 @@ async def build_and_save_indexes(repo_path: str, output_dir: str = "public"):
     index_1 = await convert_index_id_to_index_author(index_0)
     index_0 = escape_hash_in_index(index_0, "url")
     index_1 = escape_hash_in_index(index_1, "author")
-    with open(out_dir / "index_0.json", "w", encoding="utf-8") as f:
-        json.dump(index_0, f, ensure_ascii=False, indent=4)
+    write_json_atomic(out_dir / "index_0.json", index_0)
 
     index_1 = escape_hash_in_index(index_1, "author")
-    with open(out_dir / "index_1.json", "w", encoding="utf-8") as f:
-        json.dump(index_1, f, ensure_ascii=False, indent=4)
+    write_json_atomic(out_dir / "index_1.json", index_1)
+
+    # 同内容的二进制索引，服务端可 mmap 按需读取
+    write_binary_index(index_0, out_dir / "index_0.bin")
+
+    # 记录构建时的 Dress HEAD，供服务端增量更新
+    write_index_meta(out_dir, get_head_sha(str(dress_dir)))
 
     print(f"✅ 索引已生成并保存至: {out_dir.absolute()}")
+
+
+async def build_and_save_ndjson(repo_path: str, output_dir: str = "public"):
+    """
+    以 NDJSON 逐条写出 index_0.ndjson 和 index_1.ndjson，条目构建完立即写盘，不在内存中保存整个索引
+    :param repo_path: Dress 仓库本地路径（如 "./Dress"）
+    :param output_dir: 输出目录（默认 "public"）
+    """
+    out_dir = Path(output_dir)
+    out_dir.mkdir(exist_ok=True)
+    count = await write_index_ndjson(Repo(repo_path), out_dir)
+    print(f"✅ 已逐行写出 {count} 条索引至: {out_dir.absolute()}")
 if __name__ == "__main__":
     import asyncio
     colorama.init()
-    asyncio.run(build_and_save_indexes(repo_path="./Dress", output_dir="public"))
\ No newline at end of file
+    if "--ndjson" in sys.argv[1:]:
+        asyncio.run(build_and_save_ndjson(repo_path="./Dress", output_dir="public"))
+    else:
+        asyncio.run(build_and_save_indexes(repo_path="./Dress", output_dir="public"))
\ No newline at end of file
@@ -1,23 +1,23 @@
+from __future__ import annotations
+
 import asyncio
 import sys
-from tqdm import tqdm
+from array import array
 import os
 from pathlib import Path
 import subprocess
-import random
 import json
 import logging
-import httpx
-import colorama
 from datetime import datetime
-import logging
-from typing import List, Tuple, Union, Optional, Dict
-from colorama import Fore, Style
-import uvicorn
-from dotenv import load_dotenv
-from git import Repo
-from tqdm import trange
-from tqdm.contrib.logging import logging_redirect_tqdm  
+from typing import TYPE_CHECKING, AsyncIterator, List, Tuple, Union, Optional, Dict
+from git_history import collect_history, iter_log_changes, list_blobs
+from metrics import GIT_PULL_DURATION, GIT_PULLS, INDEX_BUILD_PHASE_DURATION, track_git
+from index_store import first_author_name, ndjson_line
+from remote_index import REMOTE_INDEX_PATH, MirrorFetcher, remote_fetcher
+
+# GitPython 与 tqdm 只有构建索引时才用到，服务端启动时不导入
+if TYPE_CHECKING:
+    from git import Repo
 
 # 配置日志
 
@@ -30,39 +30,81 @@ def normalize_url(path: str) -> str:
     return path.replace("#", "%23")
 
 
+GIT_WORKERS = int(os.environ.get("GIT_WORKERS") or os.cpu_count() or 4)
+GIT_QUERY_TIMEOUT = float(os.environ.get("GIT_QUERY_TIMEOUT") or 30)
+
+
+class GitWorkerPool:
+    """
+    有并发上限的异步 git 子进程执行器
+    - max_workers: 同时运行的 git 进程数上限（环境变量 GIT_WORKERS，默认 CPU 核数）
+    - timeout: 单次查询超时秒数（环境变量 GIT_QUERY_TIMEOUT，默认 30）
+    超时或任务被取消时会杀掉对应的 git 进程
+    """
+
+    def __init__(self, max_workers: int = GIT_WORKERS, timeout: float = GIT_QUERY_TIMEOUT):
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        # 信号量在第一次需要等待时才绑定到当前事件循环，服务只有 lifespan 所在的一个循环
+        self._semaphore = asyncio.Semaphore(self.max_workers)
+
+    async def run(self, args: List[str], cwd: str, timeout: Optional[float] = None) -> Tuple[int, str, str]:
+        """执行 git <args>，返回 (returncode, stdout, stderr)；超时抛出 TimeoutError"""
+        async with self._semaphore:
+            # track_git 是同步的上下文管理器，只能用 with
+            with track_git(args[0]):
+                proc = await asyncio.create_subprocess_exec(
+                    "git", *args,
+                    cwd=cwd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                try:
+                    stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout or self.timeout)
+                except BaseException:
+                    # 超时或取消：不留下孤儿进程
+                    if proc.returncode is None:
+                        proc.kill()
+                        await proc.wait()
+                    raise
+            return (
+                proc.returncode,
+                stdout.decode("utf-8", errors="replace"),
+                stderr.decode("utf-8", errors="replace")
+            )
+
+
+git_pool = GitWorkerPool()
+
+
 async def _run_git_log_follow(repo: Repo, file_path: str) -> List[List[str]]:
     """
     执行 git log --follow --format="%H|%an|%ae|%cI" -- <file>
-    使用 repo.working_dir 作为 cwd
+    使用 repo.working_dir 作为 cwd，通过 git_pool 限制并发
     返回 [[commit_hash, author_name, author_email, committed_iso_time], ...]
     """
     try:
-        # 修复：使用 subprocess.run 而不是 asyncio.subprocess.run
-        result = subprocess.run(
+        returncode, stdout, stderr = await git_pool.run(
             [
-                "git", "log", "--follow",
+                "log", "--follow",
                 "--format=%H|%an|%ae|%cI",
                 "--", file_path
             ],
-            cwd=repo.working_dir,  # 👈 关键：从 repo 对象获取路径
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            timeout=30
+            cwd=repo.working_dir  # 👈 关键：从 repo 对象获取路径
         )
-        if result.returncode != 0:
-            logging.warning(f"git log --follow failed for {file_path}: {result.stderr}")
+        if returncode != 0:
+            logging.warning(f"git log --follow failed for {file_path}: {stderr}")
             return []
         
         lines = []
-        for line in result.stdout.strip().split('\n'):
+        for line in stdout.strip().split('\n'):
             if line and '|' in line:
                 parts = line.split('|', 3)
                 if len(parts) == 4:
                     lines.append(parts)
         return lines
-    except Exception as e:
-        logging.error(f"执行 git log --follow 出错 ({file_path}): {e}")
+    except asyncio.TimeoutError:
+        logging.error(f"git log --follow 超时 ({file_path})")
         return []
 
 async def get_all_committers(repo: Repo, file_path: str) -> Tuple[List[Tuple[str, str]], Optional[datetime]]:
@@ -103,67 +145,216 @@ async def get_first_commit_author(repo: Repo, file_path: str) -> Optional[Tuple[
         first_commit = commits[-1]  # 最早的 commit
         return (first_commit[1], first_commit[2])
     return None
-async def get_github_index(index:str="index_0.json") -> Dict:
-    """获取远端 GitHub 索引数据"""
+async def get_first_author_and_commit_time(repo: Repo, file_path: str) -> Tuple[Optional[Tuple[str, str]], Optional[datetime]]:
+    """一次 git log 同时得到首次添加的作者和最新提交时间"""
+    commits = await _run_git_log_follow(repo, file_path)
+    if not commits:
+        return None, None
+    first_author = (commits[-1][1], commits[-1][2])
+    iso_time = commits[0][3]
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                url=f"https://cdn.jsdelivr.net/gh/nomdn/dress-api@main/public/{index}",
-                timeout=10.0
-            )
-        response.raise_for_status()
-        data = response.json()
-        return data
-    except (httpx.TimeoutException, httpx.RequestError, httpx.HTTPStatusError):
-        logging.warning("获取远端索引数据超时，正在重试...")
-        # 修正 CDN 域名拼写（jsdelivr.net，不是 jsdeliver.net）
-        for i in [
-            "https://cdn.jsdelivr.net/",
-            "https://fastly.jsdelivr.net/",
-            "https://gcore.jsdelivr.net/",
-            "https://testingcf.jsdelivr.net/"
-        ]:
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(
-                        url=f"{i}gh/nomdn/dress-api@main/public/{index}",
-                        timeout=10.0
-                    )
-                response.raise_for_status()
-                data = response.json()
-                return data
-            except (httpx.TimeoutException, httpx.RequestError, httpx.HTTPStatusError):
-                continue
-        else:
-            raise RuntimeError("获取远端数据失败！")
+        return first_author, datetime.fromisoformat(iso_time.replace('Z', '+00:00'))
+    except ValueError as e:
+        logging.warning(f"时间解析失败 ({iso_time}): {e}")
+        return first_author, None
+async def get_github_index(index:str="index_0.json", fetcher: Optional[MirrorFetcher] = None) -> Dict:
+    """获取远端 GitHub 索引数据，经共享连接池对冲请求各 jsDelivr 镜像"""
+    response = await (fetcher or remote_fetcher).fetch(f"{REMOTE_INDEX_PATH}{index}")
+    return response.json()
 
 def run_git_pull():
-    """在后台执行 git pull"""
+    """执行 git pull，失败、超时或无法启动时抛出 RuntimeError，消息中带有 git 的错误输出"""
+    outcome = "error"
     try:
-        result = subprocess.run(
-            ["git", "pull"],
-            cwd="Dress",  # 👈 替换为你的本地仓库路径
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        with GIT_PULL_DURATION.time(), track_git("pull"):
+            result = subprocess.run(
+                ["git", "pull"],
+                cwd="Dress",  # 👈 替换为你的本地仓库路径
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
         if result.returncode != 0:
+            outcome = "failure"
             logging.error(f"Git pull failed: {result.stderr}")
-        else:
-            logging.info("Git pull succeeded")
+            raise RuntimeError(f"git pull 失败: {result.stderr.strip()}")
+        outcome = "success"
+        logging.info("Git pull succeeded")
     except subprocess.TimeoutExpired as e:
+        outcome = "timeout"
         logging.error(f"Git pull 超时: {e}")
-    except subprocess.SubprocessError as e:
+        raise RuntimeError(f"git pull 超时: {e}") from e
+    except (subprocess.SubprocessError, OSError) as e:
         logging.error(f"Git pull 子进程错误: {e}")
-    except Exception as e:
-        logging.error(f"Git pull 未知错误: {e}")
+        raise RuntimeError(f"git pull 子进程错误: {e}") from e
+    finally:
+        GIT_PULLS.labels(outcome).inc()
+
+INDEX_META_FILE = "index_meta.json"
+
+
+def get_head_sha(repo_dir: str = "Dress") -> Optional[str]:
+    """获取仓库当前 HEAD 的提交 SHA，失败时返回 None"""
+    try:
+        with track_git("rev-parse"):
+            result = subprocess.run(
+                ["git", "rev-parse", "HEAD"],
+                cwd=repo_dir,
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
+    except (subprocess.SubprocessError, OSError) as e:
+        logging.error(f"获取 HEAD 失败: {e}")
+        return None
+    if result.returncode != 0:
+        logging.error(f"获取 HEAD 失败: {result.stderr}")
+        return None
+    return result.stdout.strip()
+
+
+def read_index_meta(output_dir: Union[str, Path] = "public") -> Dict:
+    """读取索引元数据（构建时的 Dress HEAD 等），不存在或损坏时返回空字典"""
+    try:
+        with open(Path(output_dir) / INDEX_META_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def write_index_meta(output_dir: Union[str, Path] = "public", head: Optional[str] = None):
+    """
+    记录索引对应的 Dress HEAD
+    head 为 None 时删除元数据（如使用远端索引，无法对应本地提交）
+    """
+    meta_path = Path(output_dir) / INDEX_META_FILE
+    if head is None:
+        meta_path.unlink(missing_ok=True)
+        return
+    write_json_atomic(meta_path, {"head": head})
+
+
+def write_json_atomic(path: Union[str, Path], obj, indent: Optional[int] = 4):
+    """先写同目录下的临时文件再替换，读取方只会看到旧文件或完整的新文件"""
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.tmp.{os.getpid()}")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
 
-def get_dress_image_paths(IMG_EXTENSIONS: set = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}) -> List[str]:
-    # 获取当前脚本所在目录（即主程序目录）
-    main_dir = Path(__file__).parent.resolve()
+def _blob_lookup(blobs: Dict[str, Tuple[str, int]]) -> Dict[str, Tuple[str, int]]:
+    """同时以原路径和转义后的路径查找 blob 信息"""
+    lookup = dict(blobs)
+    lookup.update((normalize_url(path), info) for path, info in blobs.items())
+    return lookup
 
-    # Dress 目录路径（主程序目录下的子目录）
-    dress_dir = main_dir / "Dress"
+
+def attach_blob_info(index_0: Dict, blobs: Dict[str, Tuple[str, int]]) -> Dict:
+    """
+    按路径为 index_0 条目补上 git blob SHA 与字节数，条目变为 [path, uploader, latest_commit_time, blob_sha, size]
+    blobs 来自 list_blobs（未转义路径），index_0 中的路径转义与否均可；找不到的条目只保留前三项
+    """
+    lookup = _blob_lookup(blobs)
+    for key, entry in index_0.items():
+        if not isinstance(entry, list) or not entry:
+            continue
+        head = (list(entry[:3]) + [None, None])[:3]
+        info = lookup.get(entry[0])
+        index_0[key] = head + list(info) if info else head
+    return index_0
+
+
+async def update_index(repo: Repo, index_0: Dict, since: str,
+                       IMG_EXTENSIONS: set = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}) -> Optional[Dict[str, List]]:
+    """
+    基于上次构建时的 HEAD 增量更新 index_0（已转义的格式）
+    只重算 since..HEAD 之间新增、修改、重命名、删除的图片，未变化的条目保持原 id，
+    重命名的图片沿用旧路径的 id
+
+    Returns:
+        Optional[Dict[str, List]]: 新的 index_0；since 不是 HEAD 的祖先（历史被改写）时返回 None，需全量重建
+    """
+    repo_dir = repo.working_dir
+    with track_git("merge-base"):
+        check = await asyncio.to_thread(
+            subprocess.run,
+            ["git", "merge-base", "--is-ancestor", since, "HEAD"],
+            cwd=repo_dir, capture_output=True, timeout=30
+        )
+    if check.returncode != 0:
+        logging.warning(f"{since} 不是当前 HEAD 的祖先，需要全量重建索引")
+        return None
+
+    def scan_changes():
+        touched = set()
+        renamed_from = {}
+        for _, status, paths in iter_log_changes(repo_dir, f"{since}..HEAD"):
+            touched.update(paths)
+            if status[:1] == "R" and len(paths) == 2:
+                # 提交按最新 → 最早到达，只记录每个路径最近一次的来源
+                renamed_from.setdefault(paths[1], paths[0])
+        return touched, renamed_from
+
+    with INDEX_BUILD_PHASE_DURATION.time("update_index", "scan_changes"):
+        touched, renamed_from = await asyncio.to_thread(scan_changes)
+    with INDEX_BUILD_PHASE_DURATION.time("update_index", "blobs"):
+        blobs = await asyncio.to_thread(list_blobs, repo_dir)
+    if not touched:
+        return attach_blob_info({str(key): value for key, value in index_0.items()}, blobs)
+
+    dress_dir = Path(repo_dir)
+    current = sorted(
+        p for p in touched
+        if Path(p).suffix.lower() in IMG_EXTENSIONS and (dress_dir / p).is_file()
+    )
+    with INDEX_BUILD_PHASE_DURATION.time("update_index", "history"):
+        histories = await asyncio.to_thread(collect_history, repo_dir, current) if current else {}
+
+    result = {str(key): value for key, value in index_0.items()}
+    path_ids = {entry[0]: key for key, entry in result.items()}
+    next_id = max((int(key) for key in result), default=0) + 1
+    for path in touched:
+        key = path_ids.get(normalize_url(path))
+        if key is not None:
+            result.pop(key, None)
+
+    for path in current:
+        key = path_ids.get(normalize_url(path))
+        source = renamed_from.get(path)
+        seen = set()
+        while key is None and source is not None and source not in seen:
+            seen.add(source)
+            key = path_ids.get(normalize_url(source))
+            source = renamed_from.get(source)
+        uploader_data, latest_commit_time = histories[path].committers()
+        if not uploader_data:
+            logging.warning(f"⚠️ 警告: {path} 无提交记录，跳过")
+            continue
+        if key is None or key in result:
+            key = str(next_id)
+            next_id += 1
+        result[key] = [
+            normalize_url(path),
+            uploader_data,
+            latest_commit_time.isoformat() if latest_commit_time else None
+        ]
+
+    logging.info(f"增量更新索引: 涉及 {len(touched)} 个路径，重算 {len(current)} 张图片")
+    return attach_blob_info(result, blobs)
+
+def get_dress_image_paths(IMG_EXTENSIONS: set = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'},
+                          dress_dir: Optional[Union[str, Path]] = None) -> List[str]:
+    if dress_dir is None:
+        # 获取当前脚本所在目录（即主程序目录）
+        main_dir = Path(__file__).parent.resolve()
+
+        # Dress 目录路径（主程序目录下的子目录）
+        dress_dir = main_dir / "Dress"
+    dress_dir = Path(dress_dir)
 
     if not dress_dir.exists():
         raise FileNotFoundError(f"Dress 目录不存在: {dress_dir}")
@@ -180,12 +371,57 @@ def get_dress_image_paths(IMG_EXTENSIONS: set = {'.jpg', '.jpeg', '.png', '.gif'
 
     return sorted(image_paths)
 
-async def build_index(repo: Repo) -> Dict[int, List]:
+def open_repo(path: Union[str, Path] = "Dress") -> Repo:
+    """打开 Dress 仓库，首次调用时才导入 GitPython"""
+    from git import Repo
+    return Repo(path)
+
+
+async def iter_index_entries(repo: Repo, engine: str = "single_pass") -> AsyncIterator[Tuple[int, List]]:
+    """
+    逐条产出 build_index 的 (序号, 条目)，条目为 [相对路径, 提交者列表, 最新提交时间, blob SHA, 字节数]
+    调用方可以边产出边写出，不必在内存中保存整个索引
     """
-    构建图片索引字典，键为序号，值为 [相对路径, 提交者列表, 最新提交时间]
+    from tqdm import tqdm
+    from tqdm.asyncio import tqdm_asyncio
+    from tqdm.contrib.logging import logging_redirect_tqdm
+
+    with INDEX_BUILD_PHASE_DURATION.time("build_index", "list_images"):
+        paths = get_dress_image_paths(dress_dir=repo.working_dir)
+    logging.info(f"共找到 {len(paths)} 张图片")
+    with INDEX_BUILD_PHASE_DURATION.time("build_index", "history"):
+        if engine == "single_pass":
+            histories = await asyncio.to_thread(collect_history, repo.working_dir, paths)
+            results = [histories[i].committers() for i in paths]
+        else:
+            # 逐文件查询交给 git_pool 并发执行
+            with logging_redirect_tqdm():
+                results = await tqdm_asyncio.gather(
+                    *(get_all_committers(repo, i) for i in paths),
+                    desc="查询提交历史", file=sys.stdout
+                )
+    # 记录 HEAD 中的 blob SHA 与字节数，供内容寻址的图片 URL 使用
+    with INDEX_BUILD_PHASE_DURATION.time("build_index", "blobs"):
+        blobs = _blob_lookup(await asyncio.to_thread(list_blobs, repo.working_dir))
+
+    with logging_redirect_tqdm():
+        for c, (i, (uploader_data, latest_commit_time)) in enumerate(tqdm(list(zip(paths, results)), desc="构建索引",file=sys.stdout), start=1):
+            if not uploader_data:
+                logging.warning(f"⚠️ 警告: {i} 无提交记录，跳过")
+                continue
+            logging.debug(f"处理图片 {c}: {i}, 上传者: {uploader_data}, 最新提交时间: {latest_commit_time}")
+            # 包含时间信息
+            info = blobs.get(i)
+            yield c, [i, uploader_data, latest_commit_time] + (list(info) if info else [])
+
+
+async def build_index(repo: Repo, engine: str = "single_pass") -> Dict[int, List]:
+    """
+    构建图片索引字典，键为序号，值为 [相对路径, 提交者列表, 最新提交时间, blob SHA, 字节数]
     
     Args:
         repo (Repo): Git 仓库对象
+        engine (str): "single_pass" 单次 git log 遍历全部历史；"follow" 逐文件 git log --follow
 
     Returns:
         Dict[int, List]: 索引字典
@@ -198,18 +434,8 @@ async def build_index(repo: Repo) -> Dict[int, List]:
     index = {}
 
     try:
-        paths = get_dress_image_paths()
-        logging.info(f"共找到 {len(paths)} 张图片")
-        with logging_redirect_tqdm():
-            for c, i in enumerate(tqdm(paths, desc="构建索引",file=sys.stdout), start=1):
-                uploader_data,latest_commit_time = await get_all_committers(repo, i)
-                if not uploader_data:
-                    logging.warning(f"⚠️ 警告: {i} 无提交记录，跳过")
-                    continue
-                logging.debug(f"处理图片 {c}: {i}, 上传者: {uploader_data}, 最新提交时间: {latest_commit_time}")
-                # 包含时间信息
-                index[c] = [i, uploader_data, latest_commit_time]
-
+        async for c, item in iter_index_entries(repo, engine):
+            index[c] = item
         return index
 
     except FileNotFoundError:
@@ -221,17 +447,63 @@ async def build_index(repo: Repo) -> Dict[int, List]:
         raise
 
 
-async def build_index_by_author(repo: Repo) -> Dict[str, List[Dict]]:
+async def write_index_ndjson(repo: Repo, output_dir: Union[str, Path] = "public",
+                             engine: str = "single_pass") -> int:
+    """
+    边构建边写出 index_0.ndjson / index_1.ndjson，行格式与 /dress/v1/index/{name}?format=ndjson 相同：
+    index_0 每行 [id, 条目]，index_1 每行 [首次作者, {"path", "latest_commit_time"}]，路径已转义
+    index_1 的行顺序也与接口一致：按作者分组，作者按首次出现排序，组内按 index_0 顺序。
+    index_1 的行先按构建顺序写入暂存文件，只记录每个作者各行的位置，构建完成后再分组拷出
+    先写临时文件，完成后再替换，返回写出的条目数
+    """
+    out_dir = Path(output_dir)
+    targets = [out_dir / "index_0.ndjson", out_dir / "index_1.ndjson"]
+    tmp_paths = [path.with_name(path.name + ".tmp") for path in targets]
+    spool_path = targets[1].with_name(targets[1].name + ".spool")
+    # 作者 -> [起始位置, 长度, 起始位置, 长度, ...]
+    spans: Dict[str, array] = {}
+    count = 0
+    try:
+        with open(tmp_paths[0], "wb") as f0, open(spool_path, "wb") as spool:
+            async for key, item in iter_index_entries(repo, engine):
+                entry = escape_hash_in_index({key: item}, "url")[key]
+                f0.write(ndjson_line(str(key), entry) + b"\n")
+                author = first_author_name(item[1])
+                if author is not None:
+                    line = ndjson_line(author, {"path": entry[0], "latest_commit_time": entry[2]}) + b"\n"
+                    spans.setdefault(author, array("Q")).extend((spool.tell(), len(line)))
+                    spool.write(line)
+                count += 1
+        with open(spool_path, "rb") as spool, open(tmp_paths[1], "wb") as f1:
+            for author_spans in spans.values():
+                for i in range(0, len(author_spans), 2):
+                    spool.seek(author_spans[i])
+                    f1.write(spool.read(author_spans[i + 1]))
+    finally:
+        if spool_path.exists():
+            os.remove(spool_path)
+    for tmp_path, target in zip(tmp_paths, targets):
+        os.replace(tmp_path, target)
+    return count
+
+
+async def build_index_by_author(repo: Repo, engine: str = "single_pass") -> Dict[str, List[Dict]]:
     """
     构建按**首次提交作者**分组的图片索引
     """
     index_name = {}
-    paths = get_dress_image_paths()
+    with INDEX_BUILD_PHASE_DURATION.time("build_index_by_author", "list_images"):
+        paths = get_dress_image_paths(dress_dir=repo.working_dir)
     logging.info(f"共找到 {len(paths)} 张图片")
+    with INDEX_BUILD_PHASE_DURATION.time("build_index_by_author", "history"):
+        if engine == "single_pass":
+            histories = await asyncio.to_thread(collect_history, repo.working_dir, paths)
+            results = [(histories[i].first_author, histories[i].committers()[1]) for i in paths]
+        else:
+            # 首次作者和最新时间共用同一次 git log 结果
+            results = await asyncio.gather(*(get_first_author_and_commit_time(repo, i) for i in paths))
 
-    for i in paths:
-        first_author = await get_first_commit_author(repo, i)  # 👈 使用新函数
-        latest_time = await get_commit_time(repo, i)
+    for i, (first_author, latest_time) in zip(paths, results):
         
         if not first_author:
             logging.warning(f"⚠️ 警告: {i} 无法追踪首次作者，跳过")
@@ -258,20 +530,13 @@ async def convert_index_id_to_index_author(index_0: dict) -> dict:
         path = entry[0]
         uploader_list = entry[1]      # [(name, email), ...]，最新在前，最早在后
         latest_time = entry[2]
-        first_author_name = uploader_list[-1][0]  # 👈 首次作者一般是列表最后一个
-        if not uploader_list:
+        author_name = first_author_name(uploader_list)
+        if author_name is None:
             continue
-
-        # 首次作者是列表最后一个
-        for name in uploader_list:
-            if name[0] =="CuteDress":
-                logging.debug(f"发现 CuteDress 作为提交者，路径: {path}")  
-            else:
-                first_author_name = name[0]
-                logging.debug(f"已追踪到正确作者: {first_author_name}，路径: {path}")
-        if first_author_name not in index_1:
-            index_1[first_author_name] = []
-        index_1[first_author_name].append({
+        logging.debug(f"已追踪到正确作者: {author_name}，路径: {path}")
+        if author_name not in index_1:
+            index_1[author_name] = []
+        index_1[author_name].append({
             "path": path,
             "latest_commit_time": latest_time
         })
@@ -302,7 +567,8 @@ def escape_hash_in_index(index_data: Dict, index_type: str) -> Dict:
                     else:
                         latest_commit_time_str = latest_commit_time
                     
-                    result[key] = [path, uploader_data, latest_commit_time_str]
+                    # blob SHA 与字节数等附加字段原样保留
+                    result[key] = [path, uploader_data, latest_commit_time_str, *value[3:]]
                 else:
                     result[key] = [path, uploader_data]  # 保持原有的结构
                 
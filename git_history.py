@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import logging
+import subprocess
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import track_git
+
+# 每个提交头以 \x01 开头，字段用 \x1f 分隔，避免与作者名/路径中的字符冲突
+_LOG_FORMAT = "%x01%H%x1f%an%x1f%ae%x1f%cI"
+_CHUNK_SIZE = 1 << 16
+
+
+class FileHistory:
+    """
+    单个文件的历史汇总，语义与 get_all_committers 一致
+    - authors: 去重后的 (name, email)，最新 → 最早
+    - latest_time: 最新提交的 ISO 时间
+    - first_author: 最早一次提交的作者
+    """
+    __slots__ = ("authors", "latest_time", "first_author", "_seen")
+
+    def __init__(self):
+        self.authors: List[Tuple[str, str]] = []
+        self.latest_time: Optional[str] = None
+        self.first_author: Optional[Tuple[str, str]] = None
+        self._seen = set()
+
+    def add_commit(self, author_name: str, author_email: str, iso_time: str):
+        # 提交按最新 → 最早的顺序到达
+        author = (author_name, author_email)
+        if self.latest_time is None:
+            self.latest_time = iso_time
+        if author not in self._seen:
+            self._seen.add(author)
+            self.authors.append(author)
+        self.first_author = author
+
+    def committers(self) -> Tuple[List[Tuple[str, str]], Optional[datetime]]:
+        """返回与 get_all_committers 相同结构的 (authors, latest_time)"""
+        latest_time = None
+        if self.latest_time:
+            try:
+                latest_time = datetime.fromisoformat(self.latest_time.replace('Z', '+00:00'))
+            except ValueError as e:
+                logging.warning(f"时间解析失败 ({self.latest_time}): {e}")
+        return list(self.authors), latest_time
+
+
+def _iter_tokens(stream) -> Iterator[str]:
+    """按 \\0 切分 git -z 输出，逐块读取，不把整个输出读进内存"""
+    pending = b""
+    while True:
+        chunk = stream.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        pending += chunk
+        parts = pending.split(b"\0")
+        pending = parts.pop()
+        for part in parts:
+            yield part.decode("utf-8", errors="replace")
+    if pending:
+        yield pending.decode("utf-8", errors="replace")
+
+
+def iter_log_changes(repo_dir: str, revision: Optional[str] = None) -> Iterator[Tuple[Tuple[str, str, str, str], str, List[str]]]:
+    """
+    流式执行一次 git log --name-status -M -C，逐条产出
+    ((commit_hash, author_name, author_email, committed_iso_time), status, [paths])
+    重命名/复制的 paths 为 [旧路径, 新路径]；revision 可限定范围，如 "old..new"
+    """
+    args = [
+        "git", "-c", "core.quotepath=off", "log", "-M", "-C", "--name-status", "-z",
+        f"--format={_LOG_FORMAT}",
+    ]
+    if revision:
+        args.append(revision)
+    # 计时覆盖整个流式读取过程，直到 git 进程退出
+    with track_git("log"):
+        proc = subprocess.Popen(
+            args,
+            cwd=repo_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            commit = None
+            tokens = _iter_tokens(proc.stdout)
+            for token in tokens:
+                token = token.lstrip("\n")
+                if not token:
+                    continue
+                if token.startswith("\x01"):
+                    parts = token[1:].rstrip("\n").split("\x1f", 3)
+                    commit = tuple(parts) if len(parts) == 4 else None
+                    continue
+                if commit is None:
+                    continue
+                status = token
+                # R/C 后面跟两个路径，其余状态一个
+                count = 2 if status[:1] in ("R", "C") else 1
+                paths = [next(tokens, "") for _ in range(count)]
+                yield commit, status, paths
+        finally:
+            proc.stdout.close()
+            stderr = proc.stderr.read()
+            proc.stderr.close()
+            if proc.wait() != 0:
+                logging.warning(f"git log --name-status 失败: {stderr.decode('utf-8', errors='replace')}")
+
+
+def collect_history(repo_dir: str, paths: Iterable[str]) -> Dict[str, FileHistory]:
+    """
+    单次遍历提交历史，自行折叠重命名，得到每个当前路径的 FileHistory
+    等价于对每个路径执行 git log --follow，但只启动一个 git 进程
+    注意：--follow 会从未修改的文件里找复制来源（find-copies-harder），
+    这里只识别同一提交中被修改文件的复制，差异可用 verify_against_follow 检出
+    """
+    histories: Dict[str, FileHistory] = {}
+    # 历史上的路径 → 追踪它的当前路径列表（旧路径可能与现存文件同名）
+    aliases: Dict[str, List[str]] = {}
+    for path in paths:
+        histories[path] = FileHistory()
+        aliases[path] = [path]
+
+    for (_, author_name, author_email, iso_time), status, change_paths in iter_log_changes(repo_dir):
+        target = change_paths[-1]
+        followers = aliases.get(target)
+        if not followers:
+            continue
+        for current in followers:
+            histories[current].add_commit(author_name, author_email, iso_time)
+        if status[:1] in ("R", "C") and len(change_paths) == 2:
+            # 与 --follow 相同：更早的历史改为追踪来源路径
+            del aliases[target]
+            aliases.setdefault(change_paths[0], []).extend(followers)
+
+    return histories
+
+
+def list_blobs(repo_dir: str, revision: str = "HEAD") -> Dict[str, Tuple[str, int]]:
+    """
+    单次 git ls-tree 列出 revision 下全部文件的 blob SHA 与字节数
+    返回 {相对路径: (blob_sha, size)}
+    """
+    with track_git("ls-tree"):
+        result = subprocess.run(
+            ["git", "-c", "core.quotepath=off", "ls-tree", "-r", "-z", "--long", revision],
+            cwd=repo_dir,
+            capture_output=True,
+            timeout=60
+        )
+    if result.returncode != 0:
+        logging.warning(f"git ls-tree 失败: {result.stderr.decode('utf-8', errors='replace')}")
+        return {}
+    blobs = {}
+    for record in result.stdout.split(b"\0"):
+        if not record:
+            continue
+        meta, _, path = record.decode("utf-8", errors="replace").partition("\t")
+        # <mode> <type> <object> <size>，size 左侧用空格补齐
+        parts = meta.split()
+        if len(parts) == 4 and parts[1] == "blob":
+            blobs[path] = (parts[2], int(parts[3]))
+    return blobs
+
+
+async def verify_against_follow(repo, paths: Iterable[str]) -> List[Tuple[str, object, object]]:
+    """
+    逐个路径对比单次遍历与 get_all_committers（git log --follow）的结果
+    返回不一致的 [(path, single_pass, follow), ...]
+    """
+    from dress_tools import get_all_committers
+
+    paths = list(paths)
+    histories = await asyncio.to_thread(collect_history, repo.working_dir, paths)
+    expected_results = await asyncio.gather(*(get_all_committers(repo, path) for path in paths))
+    mismatches = []
+    for path, expected in zip(paths, expected_results):
+        actual = histories[path].committers()
+        if actual != expected:
+            mismatches.append((path, actual, expected))
+    return mismatches
+
+
+if __name__ == "__main__":
+    from git import Repo
+    from dress_tools import get_dress_image_paths
+
+    parser = argparse.ArgumentParser(description="校验单次遍历的历史提取与 git log --follow 的结果是否一致")
+    parser.add_argument("--sample", type=int, default=0, help="只抽查前 N 个路径，0 表示全部")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
+    all_paths = get_dress_image_paths()
+    if args.sample:
+        all_paths = all_paths[:args.sample]
+    result = asyncio.run(verify_against_follow(Repo("Dress"), all_paths))
+    for path, actual, expected in result:
+        logging.error(f"不一致: {path}\n  single-pass: {actual}\n  --follow:    {expected}")
+    logging.info(f"共校验 {len(all_paths)} 个路径，不一致 {len(result)} 个")
+    raise SystemExit(1 if result else 0)
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence, Tuple
+
+import httpx
+
+from remote_index import JSDELIVR_MIRRORS
+
+HEALTH_PROBE_INTERVAL = float(os.environ.get("HEALTH_PROBE_INTERVAL") or 60)
+HEALTH_PROBE_TIMEOUT = float(os.environ.get("HEALTH_PROBE_TIMEOUT") or 10)
+
+PROBE_TARGETS = {
+    "github": ["https://api.github.com"],
+    "jsdelivr": JSDELIVR_MIRRORS,
+}
+
+
+class ProbeResult:
+    """一次探测的结果；checked_at 预先格式化，读取时不再计算"""
+    __slots__ = ("ok", "latency_ms", "checked_at", "checked_at_ts")
+
+    def __init__(self, ok: bool, latency_ms: Optional[float]):
+        self.ok = ok
+        self.latency_ms = latency_ms
+        self.checked_at_ts = time.time()
+        self.checked_at = datetime.fromtimestamp(self.checked_at_ts, timezone.utc).isoformat(timespec="seconds")
+
+
+class ConnectivityProber:
+    """
+    后台按固定间隔探测上游连通性，只保留最近一次结果
+    - targets: 名称 → 候选 URL，任一返回 200/301 即视为连通
+    - interval: 探测间隔秒数（环境变量 HEALTH_PROBE_INTERVAL，默认 60）
+    /health 只读取 results，不发起任何外部请求
+    """
+
+    def __init__(self, targets: Dict[str, Sequence[str]] = PROBE_TARGETS,
+                 interval: float = HEALTH_PROBE_INTERVAL, timeout: float = HEALTH_PROBE_TIMEOUT):
+        self.targets = {name: list(urls) for name, urls in targets.items()}
+        self.interval = interval
+        self.timeout = timeout
+        self.results: Dict[str, Optional[ProbeResult]] = {name: None for name in self.targets}
+
+    async def _probe_url(self, client: httpx.AsyncClient, url: str) -> Tuple[bool, Optional[float]]:
+        start = time.perf_counter()
+        try:
+            resp = await client.get(url, timeout=self.timeout)
+        except httpx.RequestError:
+            return False, None
+        return resp.status_code in (200, 301), (time.perf_counter() - start) * 1000
+
+    async def probe(self, client: httpx.AsyncClient, name: str) -> ProbeResult:
+        """并发探测 name 的全部候选 URL，记录最快的成功延迟"""
+        outcomes = await asyncio.gather(*(self._probe_url(client, url) for url in self.targets[name]))
+        latencies = [latency for ok, latency in outcomes if ok]
+        result = ProbeResult(bool(latencies), round(min(latencies), 1) if latencies else None)
+        self.results[name] = result
+        return result
+
+    async def probe_all(self, client: httpx.AsyncClient):
+        await asyncio.gather(*(self.probe(client, name) for name in self.targets))
+
+    async def run(self):
+        """常驻任务：立即探测一次，之后每 interval 秒探测一次，直到被取消"""
+        async with httpx.AsyncClient() as client:
+            while True:
+                try:
+                    await self.probe_all(client)
+                    logging.debug(f"连通性探测完成: { {name: r.ok for name, r in self.results.items() if r} }")
+                except Exception as e:
+                    logging.error(f"连通性探测失败: {e}")
+                await asyncio.sleep(self.interval)
+
+    def status(self, name: str) -> Optional[bool]:
+        """最近一次探测是否连通，尚未探测时为 None"""
+        result = self.results.get(name)
+        return None if result is None else result.ok
+
+    def snapshot(self) -> Dict[str, Optional[Dict]]:
+        return {
+            name: None if result is None else {
+                "ok": result.ok,
+                "latency_ms": result.latency_ms,
+                "checked_at": result.checked_at,
+            }
+            for name, result in self.results.items()
+        }
+
+
+connectivity_prober = ConnectivityProber()
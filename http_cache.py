@@ -0,0 +1,116 @@
+import zlib
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from index_store import EncodedPayload
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: Iterable[str]) -> str:
+    """
+    按 Accept-Encoding 选出响应编码，优先 br，其次 gzip，都不接受时返回 identity
+    q=0 表示明确拒绝；"*" 匹配未单独列出的编码
+    """
+    if not accept_encoding:
+        return "identity"
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    best, best_q = "identity", 0.0
+    for encoding in ("br", "gzip"):
+        if encoding not in available:
+            continue
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def etag_matches(if_none_match: str, etags: Iterable[str]) -> bool:
+    """If-None-Match 使用弱比较：忽略 W/ 前缀，任一编码的 ETag 命中即可"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return any(etag in candidates for etag in etags)
+
+
+def not_modified_since(if_modified_since: str, last_modified_ts: int) -> bool:
+    try:
+        return int(parsedate_to_datetime(if_modified_since).timestamp()) >= last_modified_ts
+    except (TypeError, ValueError):
+        return False
+
+
+def encoded_response(request: Request, payload: EncodedPayload, media_type: str = "application/json") -> Response:
+    """
+    返回预编码的响应体，带 ETag / Last-Modified，命中条件请求时返回 304
+    304 只比较请求头，不触碰 JSON 内容
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), payload.bodies)
+    headers = {
+        "ETag": payload.etags[encoding],
+        "Last-Modified": payload.last_modified,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag_matches(if_none_match, payload.etags.values()):
+            return Response(status_code=304, headers=headers)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and not_modified_since(if_modified_since, payload.last_modified_ts):
+            return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=payload.bodies[encoding], media_type=media_type, headers=headers)
+
+
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+def _line_chunks(lines: Iterable[bytes], compress: bool, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """把行攒成约 chunk_size 字节的块再发送，需要时逐块 gzip 压缩"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line) + 1
+        if size >= chunk_size:
+            data = b"\n".join(buffer) + b"\n"
+            buffer, size = [], 0
+            if compressor:
+                # 每块同步刷新，客户端收到即可解压出完整的行
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield data
+    data = b"\n".join(buffer) + b"\n" if buffer else b""
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def streamed_lines_response(request: Request, lines: Iterable[bytes], headers: Optional[Dict[str, str]] = None,
+                            media_type: str = "application/x-ndjson") -> StreamingResponse:
+    """
+    以分块传输逐行返回（每行后补换行），客户端收到第一块即可开始解析
+    lines 是同步迭代器，由线程池逐块取值，渲染不占用事件循环；接受 gzip 时边压缩边发送
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), ("gzip",))
+    headers = {**(headers or {}), "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if encoding == "gzip":
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_line_chunks(lines, encoding == "gzip"), media_type=media_type, headers=headers)
@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 可选依赖，未安装时不提供缩略图
+    Image = None
+
+DERIVATIVE_CACHE_DIR = os.environ.get("DERIVATIVE_CACHE_DIR") or "cache/img"
+DERIVATIVE_CACHE_MAX_BYTES = int(os.environ.get("DERIVATIVE_CACHE_MAX_MB") or 1024) * 1024 * 1024
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS") or os.cpu_count() or 2)
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "png": ("PNG", "image/png", "png"),
+}
+# 未指定 fmt 时按原图扩展名选择输出格式
+DEFAULT_FORMATS = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".webp": "webp"}
+QUALITY = 80
+
+
+def git_blob_sha(path: Union[str, Path]) -> str:
+    """与 git hash-object 相同的 blob SHA-1"""
+    path = Path(path)
+    digest = hashlib.sha1(b"blob %d\0" % path.stat().st_size)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# 路径 → (size, mtime_ns, blob_sha)，文件未变时不重复计算哈希
+_blob_shas: Dict[str, Tuple[int, int, str]] = {}
+
+
+def cached_blob_sha(path: Union[str, Path]) -> str:
+    """git_blob_sha 的带缓存版本，以文件大小与修改时间判断是否需要重算"""
+    stat = os.stat(path)
+    cached = _blob_shas.get(str(path))
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+    sha = git_blob_sha(path)
+    _blob_shas[str(path)] = (stat.st_size, stat.st_mtime_ns, sha)
+    return sha
+
+
+def render_derivative(source: str, target: str, width: Optional[int], fmt: str) -> int:
+    """
+    在工作进程中执行：按 EXIF 方向摆正、等比缩到 width（不放大）、转码后写入 target
+    先写临时文件再替换，返回文件字节数
+    """
+    pil_format = FORMATS[fmt][0]
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        if width and img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif img.mode == "P":
+            img = img.convert("RGBA")
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        options = {"optimize": True} if pil_format == "PNG" else {"quality": QUALITY}
+        img.save(tmp_path, pil_format, **options)
+    os.replace(tmp_path, target)
+    return os.path.getsize(target)
+
+
+class DerivativeCache:
+    """
+    图片衍生版本（缩放 / 转码）的磁盘 LRU 缓存
+    - 文件名由原图 git blob SHA 与参数组成，原图内容变化后自然失效
+    - 转码在进程池中执行（环境变量 IMAGE_WORKERS），不阻塞事件循环
+    - 同一衍生版本的并发请求合并为一次转码
+    - 总大小超过 max_bytes（环境变量 DERIVATIVE_CACHE_MAX_MB，默认 1024）时按最近使用时间淘汰
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = DERIVATIVE_CACHE_DIR,
+                 max_bytes: int = DERIVATIVE_CACHE_MAX_BYTES, workers: int = IMAGE_WORKERS):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.workers = max(1, workers)
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._loaded = False
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def _load(self):
+        """扫描已有缓存文件，按修改时间恢复 LRU 顺序（命中时会 touch 文件）"""
+        files = []
+        if self.cache_dir.exists():
+            for path in self.cache_dir.glob("*/*"):
+                if path.suffix == ".tmp":
+                    path.unlink(missing_ok=True)
+                    continue
+                stat = path.stat()
+                files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self.total_bytes += size
+        self._loaded = True
+
+    def _path(self, name: str) -> Path:
+        return self.cache_dir / name[:2] / name
+
+    def _evict(self):
+        victims = []
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            victims.append(self._path(name))
+        return victims
+
+    async def get(self, source: Path, width: Optional[int], fmt: str,
+                  blob_sha: Optional[str] = None) -> Path:
+        """返回衍生版本的缓存文件路径，不存在时生成；blob_sha 已知时可省去哈希计算"""
+        if not self._loaded:
+            await asyncio.to_thread(self._load)
+        if blob_sha is None:
+            blob_sha = await asyncio.to_thread(cached_blob_sha, source)
+        name = f"{blob_sha}-w{width or 0}.{FORMATS[fmt][2]}"
+        path = self._path(name)
+        if name in self._entries and path.exists():
+            self._entries.move_to_end(name)
+            await asyncio.to_thread(os.utime, path)
+            return path
+
+        future = self._inflight.get(name)
+        if future is None:
+            future = asyncio.ensure_future(self._render(source, path, width, fmt))
+            self._inflight[name] = future
+            future.add_done_callback(lambda _: self._inflight.pop(name, None))
+        # shield：某个请求断开不会取消其他请求正在等待的同一次转码
+        return await asyncio.shield(future)
+
+    async def _render(self, source: Path, path: Path, width: Optional[int], fmt: str) -> Path:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        size = await loop.run_in_executor(self._pool, render_derivative, str(source), str(path), width, fmt)
+        previous = self._entries.pop(path.name, None)
+        if previous is not None:
+            self.total_bytes -= previous
+        self._entries[path.name] = size
+        self.total_bytes += size
+        victims = self._evict()
+        if victims:
+            await asyncio.to_thread(lambda: [victim.unlink(missing_ok=True) for victim in victims])
+            logging.debug(f"衍生图片缓存淘汰 {len(victims)} 个文件，当前 {self.total_bytes} 字节")
+        return path
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+derivative_cache = DerivativeCache()
@@ -0,0 +1,250 @@
+"""
+index_0 的紧凑二进制格式，可 mmap 后按需读取单个条目，无需整体解析
+
+布局（小端）：
+    header       HEADER 结构
+    strings      (string_count + 1) 个 u32 偏移 + UTF-8 字符串数据
+    authors      author_count 个 (name_sid u32, email_sid u32)
+    uploaders    uploader_ref_count 个 u32 作者 id，各条目的提交者列表首尾相接
+    entries      entry_count 条定长 ENTRY 记录
+
+时间存为 epoch 秒 + 时区偏移分钟，可还原出与 git %cI 相同的 ISO 字符串；
+无法还原的时间原样放进字符串表（tz_offset 为 TZ_RAW，time 为字符串 id）
+版本 2 的条目追加 20 字节 blob SHA 与 u32 字节数，全零 SHA 表示缺失；版本 1 的文件仍可读取
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+MAGIC = b"DIDX"
+VERSION = 2
+# magic, version, reserved, entry_count, author_count, uploader_ref_count, string_count,
+# strings_offset, authors_offset, uploaders_offset, entries_offset
+HEADER = struct.Struct("<4sHHIIIIIIII")
+# id, path_sid, uploader_start, uploader_count, tz_offset_minutes, time, blob_sha, size
+ENTRY = struct.Struct("<IIIHhq20sI")
+ENTRY_V1 = struct.Struct("<IIIHhq")
+ENTRY_FORMATS = {1: ENTRY_V1, 2: ENTRY}
+NO_BLOB = bytes(20)
+AUTHOR = struct.Struct("<II")
+U32 = struct.Struct("<I")
+
+TZ_NONE = -32768  # 无时间信息
+TZ_RAW = 32767    # 时间以原始字符串存放
+
+
+def encode_commit_time(value: Optional[str], intern) -> Tuple[int, int]:
+    """ISO 时间 → (时区偏移分钟, epoch 秒)；无法精确还原时返回 (TZ_RAW, intern(原字符串))"""
+    if value is None:
+        return TZ_NONE, 0
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        offset = parsed.utcoffset()
+        if offset is not None and offset.total_seconds() % 60 == 0 and parsed.microsecond == 0:
+            minutes = int(offset.total_seconds() // 60)
+            if decode_commit_time(minutes, int(parsed.timestamp())) == value:
+                return minutes, int(parsed.timestamp())
+    except (AttributeError, ValueError):
+        pass
+    return TZ_RAW, intern(str(value))
+
+
+def decode_commit_time(tz_offset: int, value: int) -> Optional[str]:
+    return datetime.fromtimestamp(value, timezone(timedelta(minutes=tz_offset))).isoformat()
+
+
+def write_binary_index(index_0: Dict, path: Union[str, Path]):
+    """把 index_0（{id: [path, uploader, latest_commit_time]}）写成二进制索引"""
+    strings: List[bytes] = []
+    string_ids: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        sid = string_ids.get(value)
+        if sid is None:
+            sid = string_ids[value] = len(strings)
+            strings.append(value.encode("utf-8"))
+        return sid
+
+    authors: List[Tuple[int, int]] = []
+    author_ids: Dict[Tuple[int, int], int] = {}
+    uploader_refs: List[int] = []
+    records: List[bytes] = []
+
+    for key, entry in index_0.items():
+        if not isinstance(entry, list) or not entry:
+            continue
+        start = len(uploader_refs)
+        for uploader in (entry[1] if len(entry) > 1 else []):
+            if not uploader:
+                continue
+            pair = (intern(uploader[0]), intern(uploader[1] if len(uploader) > 1 else ""))
+            aid = author_ids.get(pair)
+            if aid is None:
+                aid = author_ids[pair] = len(authors)
+                authors.append(pair)
+            uploader_refs.append(aid)
+        tz_offset, time_value = encode_commit_time(entry[2] if len(entry) > 2 else None, intern)
+        blob, size = NO_BLOB, 0
+        if len(entry) > 4 and entry[3]:
+            blob, size = bytes.fromhex(entry[3]), int(entry[4])
+        records.append(ENTRY.pack(int(key), intern(entry[0]), start, len(uploader_refs) - start, tz_offset, time_value,
+                                  blob, size))
+
+    offsets = [0]
+    for data in strings:
+        offsets.append(offsets[-1] + len(data))
+    string_section = struct.pack(f"<{len(offsets)}I", *offsets) + b"".join(strings)
+    author_section = b"".join(AUTHOR.pack(*pair) for pair in authors)
+    uploader_section = struct.pack(f"<{len(uploader_refs)}I", *uploader_refs)
+
+    strings_offset = HEADER.size
+    authors_offset = strings_offset + len(string_section)
+    uploaders_offset = authors_offset + len(author_section)
+    entries_offset = uploaders_offset + len(uploader_section)
+    header = HEADER.pack(
+        MAGIC, VERSION, 0, len(records), len(authors), len(uploader_refs), len(strings),
+        strings_offset, authors_offset, uploaders_offset, entries_offset
+    )
+    # 先写临时文件再替换，正在 mmap 旧文件的进程不受影响
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(string_section)
+        f.write(author_section)
+        f.write(uploader_section)
+        f.write(b"".join(records))
+    os.replace(tmp_path, path)
+
+
+class BinaryIndex:
+    """
+    mmap 方式打开的二进制索引，按下标惰性解码条目
+    条目结构与 index_0 的值相同：[path, [[name, email], ...], latest_commit_time, blob_sha, size]，无 blob 时只有前三项
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.entry_count, self.author_count, self.uploader_ref_count,
+         self.string_count, self._strings_offset, self._authors_offset,
+         self._uploaders_offset, self._entries_offset) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version not in ENTRY_FORMATS:
+            self._mmap.close()
+            raise ValueError(f"不是有效的二进制索引: {self.path}")
+        self._string_data_offset = self._strings_offset + (self.string_count + 1) * U32.size
+        self.version = version
+        self._entry = ENTRY_FORMATS[version]
+
+    def close(self):
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return self.entry_count
+
+    def string(self, sid: int) -> str:
+        start, end = struct.unpack_from("<II", self._mmap, self._strings_offset + sid * U32.size)
+        base = self._string_data_offset
+        return self._mmap[base + start:base + end].decode("utf-8")
+
+    def author(self, aid: int) -> List[str]:
+        name_sid, email_sid = AUTHOR.unpack_from(self._mmap, self._authors_offset + aid * AUTHOR.size)
+        return [self.string(name_sid), self.string(email_sid)]
+
+    def record(self, i: int) -> Tuple:
+        if not 0 <= i < self.entry_count:
+            raise IndexError(i)
+        return self._entry.unpack_from(self._mmap, self._entries_offset + i * self._entry.size)
+
+    def uploader_ids(self, start: int, count: int) -> Tuple[int, ...]:
+        return struct.unpack_from(f"<{count}I", self._mmap, self._uploaders_offset + start * U32.size)
+
+    def entry_id(self, i: int) -> int:
+        return self.record(i)[0]
+
+    def __getitem__(self, i: int) -> List:
+        if i < 0:
+            i += self.entry_count
+        _, path_sid, start, count, tz_offset, time_value, *blob_info = self.record(i)
+        refs = self.uploader_ids(start, count)
+        if tz_offset == TZ_NONE:
+            latest_commit_time = None
+        elif tz_offset == TZ_RAW:
+            latest_commit_time = self.string(time_value)
+        else:
+            latest_commit_time = decode_commit_time(tz_offset, time_value)
+        item = [self.string(path_sid), [self.author(aid) for aid in refs], latest_commit_time]
+        if blob_info and blob_info[0] != NO_BLOB:
+            item += [blob_info[0].hex(), blob_info[1]]
+        return item
+
+    def __iter__(self) -> Iterator[List]:
+        for i in range(self.entry_count):
+            yield self[i]
+
+    def to_index_0(self) -> Dict[str, List]:
+        """完整还原为 index_0 字典"""
+        return {str(self.entry_id(i)): self[i] for i in range(self.entry_count)}
+
+
+def convert_json_to_binary(json_path: Union[str, Path], bin_path: Union[str, Path]):
+    with open(json_path, "r", encoding="utf-8") as f:
+        write_binary_index(json.load(f), bin_path)
+
+
+def compare(json_path: Union[str, Path], bin_path: Union[str, Path], samples: int = 1000):
+    """对比 JSON 与二进制索引的体积、加载耗时，并校验内容一致"""
+    json_size = os.path.getsize(json_path)
+    bin_size = os.path.getsize(bin_path)
+
+    start = time.perf_counter()
+    with open(json_path, "r", encoding="utf-8") as f:
+        index_0 = json.load(f)
+    json_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    binary = BinaryIndex(bin_path)
+    bin_open = time.perf_counter() - start
+
+    step = max(1, len(binary) // samples)
+    start = time.perf_counter()
+    picked = [binary[i] for i in range(0, len(binary), step)]
+    bin_random = (time.perf_counter() - start) / max(1, len(picked))
+
+    start = time.perf_counter()
+    restored = binary.to_index_0()
+    bin_full = time.perf_counter() - start
+    binary.close()
+
+    expected = {str(k): v for k, v in index_0.items() if isinstance(v, list) and v}
+    same = json.loads(json.dumps(restored)) == json.loads(json.dumps(expected))
+    print(f"JSON:   {json_size / 1024:.1f} KiB, json.load {json_load * 1000:.2f} ms")
+    print(f"Binary: {bin_size / 1024:.1f} KiB ({bin_size / json_size:.1%}), "
+          f"mmap 打开 {bin_open * 1000:.3f} ms, 单条读取 {bin_random * 1e6:.2f} µs, "
+          f"完整还原 {bin_full * 1000:.2f} ms")
+    print(f"内容一致: {same}")
+    return same
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="index_0 二进制索引工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_convert = sub.add_parser("convert", help="由 index_0.json 生成二进制索引")
+    p_convert.add_argument("json_path", nargs="?", default="public/index_0.json")
+    p_convert.add_argument("bin_path", nargs="?", default="public/index_0.bin")
+    p_compare = sub.add_parser("compare", help="对比体积与加载耗时")
+    p_compare.add_argument("json_path", nargs="?", default="public/index_0.json")
+    p_compare.add_argument("bin_path", nargs="?", default="public/index_0.bin")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        convert_json_to_binary(args.json_path, args.bin_path)
+        print(f"✅ 已生成: {args.bin_path}")
+    else:
+        raise SystemExit(0 if compare(args.json_path, args.bin_path) else 1)
@@ -0,0 +1,730 @@
+import gzip
+import hashlib
+import json
+import logging
+import math
+import random
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from email.utils import formatdate
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from index_binary import NO_BLOB, TZ_NONE, TZ_RAW, BinaryIndex, decode_commit_time, encode_commit_time
+
+try:
+    import brotli
+except ImportError:  # requirements 中已包含；未安装时只提供 gzip
+    brotli = None
+
+
+class EncodedPayload:
+    """
+    预先编码好的响应体：紧凑 JSON 及其 gzip / brotli 压缩版本
+    每个编码各有一个强 ETag，Last-Modified 取所属索引代的生成时间
+    """
+    __slots__ = ("bodies", "etags", "last_modified", "last_modified_ts")
+
+    def __init__(self, body: bytes, last_modified: float):
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies: Dict[str, bytes] = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=9)
+        self.etags: Dict[str, str] = {
+            encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+            for encoding in self.bodies
+        }
+        self.last_modified_ts = int(last_modified)
+        self.last_modified = formatdate(self.last_modified_ts, usegmt=True)
+
+    @classmethod
+    def from_obj(cls, obj, last_modified: float) -> "EncodedPayload":
+        return cls(_dumps(obj), last_modified)
+
+    @classmethod
+    def from_encoded(cls, bodies: Dict[str, Union[bytes, memoryview]], etags: Dict[str, str],
+                     last_modified: float) -> "EncodedPayload":
+        """直接使用已编码好的响应体（如其他进程写出、mmap 映射的文件），不再压缩和计算摘要"""
+        payload = cls.__new__(cls)
+        payload.bodies = bodies
+        payload.etags = etags
+        payload.last_modified_ts = int(last_modified)
+        payload.last_modified = formatdate(payload.last_modified_ts, usegmt=True)
+        return payload
+
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def ndjson_line(key, value) -> bytes:
+    """
+    NDJSON 导出的一行（不含换行）：[key, value]
+    index_0 为 [id, 条目]，index_1 为 [作者, 单张图片]，按行累加即可还原原索引
+    """
+    return _dumps([key, value])
+
+
+def _commit_timestamp(item) -> float:
+    """作者索引条目的提交时间戳，缺失或无法解析时排在最后"""
+    value = item.get("latest_commit_time") if isinstance(item, dict) else None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return float("-inf")
+
+
+class AuthorImages:
+    """
+    单个作者的图片列表，条目预先序列化，并预排好各排序方式
+    分页时只拼接切片，开销与索引总大小无关
+    """
+    __slots__ = ("name", "key", "orders")
+
+    SORTS = (None, "latest_commit_time", "path")
+
+    def __init__(self, name: str, items: List):
+        self.name = name
+        self.key = _dumps(name)
+        encoded = [_dumps(item) for item in items]
+        by_time = sorted(range(len(items)), key=lambda i: _commit_timestamp(items[i]), reverse=True)
+        by_path = sorted(range(len(items)), key=lambda i: items[i].get("path", "") if isinstance(items[i], dict) else str(items[i]))
+        self.orders: Dict[Optional[str], List[bytes]] = {
+            None: encoded,
+            "latest_commit_time": [encoded[i] for i in by_time],  # 最新在前
+            "path": [encoded[i] for i in by_path],
+        }
+
+    def __len__(self) -> int:
+        return len(self.orders[None])
+
+    def render(self, sort: Optional[str] = None, offset: int = 0, limit: Optional[int] = None) -> bytes:
+        """渲染为 {author: [item, ...]}，与完整 index_1 中的结构一致"""
+        items = self.orders[sort]
+        page = items[offset:offset + limit] if limit is not None else items[offset:]
+        return b"{" + self.key + b":[" + b",".join(page) + b"]}"
+
+
+# 作者图片表的共享文件（小端）：
+#     header   AUTHORS_HEADER
+#     authors  author_count 条 (key 起点, key 终点, 首张图片序号, 图片数)，位置相对 data
+#     orders   每种排序（AuthorImages.SORTS 的顺序）item_count 个 (起点, 终点)，按作者首尾相接
+#     data     作者名与各图片预序列化的 JSON
+AUTHORS_MAGIC = b"DAUT"
+AUTHORS_VERSION = 1
+# magic, version, reserved, author_count, item_count, authors_offset, orders_offset, data_offset
+AUTHORS_HEADER = struct.Struct("<4sHHIIIII")
+AUTHOR_RECORD = struct.Struct("<IIII")
+SPAN = struct.Struct("<II")
+
+
+def encode_author_images(authors: Dict[str, AuthorImages]) -> bytes:
+    """把作者图片表编码成可 mmap 的共享文件，内容相同的图片只存一份"""
+    chunks: List[bytes] = []
+    spans: Dict[bytes, Tuple[int, int]] = {}
+    position = 0
+
+    def put(data: bytes) -> Tuple[int, int]:
+        nonlocal position
+        span = spans.get(data)
+        if span is None:
+            span = spans[data] = (position, position + len(data))
+            chunks.append(data)
+            position += len(data)
+        return span
+
+    records, first = [], 0
+    for images in authors.values():
+        records.append(AUTHOR_RECORD.pack(*put(images.key), first, len(images)))
+        for item in images.orders[None]:
+            put(item)
+        first += len(images)
+    orders = [
+        SPAN.pack(*spans[item])
+        for sort in AuthorImages.SORTS for images in authors.values() for item in images.orders[sort]
+    ]
+    authors_offset = AUTHORS_HEADER.size
+    orders_offset = authors_offset + len(records) * AUTHOR_RECORD.size
+    data_offset = orders_offset + len(orders) * SPAN.size
+    header = AUTHORS_HEADER.pack(AUTHORS_MAGIC, AUTHORS_VERSION, 0, len(records), first,
+                                 authors_offset, orders_offset, data_offset)
+    return b"".join([header, *records, *orders, *chunks])
+
+
+class MappedItems(Sequence):
+    """作者某种排序下的预序列化图片，切片时才从共享文件中读取对应的几项"""
+    __slots__ = ("view", "spans_offset", "data_offset", "count")
+
+    def __init__(self, view: memoryview, spans_offset: int, data_offset: int, count: int):
+        self.view = view
+        self.spans_offset = spans_offset
+        self.data_offset = data_offset
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i):
+        if not isinstance(i, slice):
+            if i < 0:
+                i += self.count
+            if not 0 <= i < self.count:
+                raise IndexError(i)
+            return self[i:i + 1][0]
+        start, stop, step = i.indices(self.count)
+        if step != 1:
+            return [self[k] for k in range(start, stop, step)]
+        if stop <= start:
+            return []
+        bounds = struct.unpack_from(f"<{(stop - start) * 2}I", self.view, self.spans_offset + start * SPAN.size)
+        base = self.data_offset
+        return [bytes(self.view[base + bounds[k]:base + bounds[k + 1]]) for k in range(0, len(bounds), 2)]
+
+
+class MappedAuthorImages(AuthorImages):
+    """与 AuthorImages 接口一致，orders 中的图片直接引用 mmap 的共享文件，多个进程共享同一份页缓存"""
+    __slots__ = ()
+
+    def __init__(self, name: str, key: bytes, orders: Dict[Optional[str], Sequence[bytes]]):
+        self.name = name
+        self.key = key
+        self.orders = orders
+
+
+def map_author_images(view: memoryview) -> Dict[str, AuthorImages]:
+    """从 encode_author_images 写出的文件组装作者图片表，只解码作者名，开销与图片数无关"""
+    (magic, version, _, author_count, item_count,
+     authors_offset, orders_offset, data_offset) = AUTHORS_HEADER.unpack_from(view, 0)
+    if magic != AUTHORS_MAGIC or version != AUTHORS_VERSION:
+        raise ValueError("不是有效的作者图片表")
+    authors: Dict[str, AuthorImages] = {}
+    for a in range(author_count):
+        key_start, key_end, first, count = AUTHOR_RECORD.unpack_from(view, authors_offset + a * AUTHOR_RECORD.size)
+        key = bytes(view[data_offset + key_start:data_offset + key_end])
+        orders = {
+            sort: MappedItems(view, orders_offset + (s * item_count + first) * SPAN.size, data_offset, count)
+            for s, sort in enumerate(AuthorImages.SORTS)
+        }
+        name = json.loads(key)
+        authors[name] = MappedAuthorImages(name, key, orders)
+    return authors
+
+
+class AuthorTable:
+    """
+    上传者 (name, email) 的驻留表，条目里只保存小整数 id
+    相同的上传者组合也只保存一份元组
+    """
+    __slots__ = ("authors", "_ids", "_groups")
+
+    def __init__(self):
+        self.authors: List[Tuple[str, str]] = []
+        self._ids: Dict[Tuple[str, str], int] = {}
+        self._groups: Dict[Tuple[int, ...], Tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self.authors)
+
+    def intern(self, name: str, email: str) -> int:
+        key = (name, email)
+        aid = self._ids.get(key)
+        if aid is None:
+            aid = self._ids[key] = len(self.authors)
+            self.authors.append(key)
+        return aid
+
+    def intern_group(self, uploaders) -> Tuple[int, ...]:
+        group = tuple(
+            self.intern(item[0], item[1] if len(item) > 1 else "")
+            for item in uploaders if item
+        )
+        return self._groups.setdefault(group, group)
+
+
+class Entry:
+    """
+    紧凑的索引条目
+    - uploaders: AuthorTable 中的作者 id，最新 → 最早
+    - timestamp / tz_offset: 最新提交时间的 epoch 秒与时区偏移（分钟），
+      tz_offset 为 TZ_NONE 表示无时间，为 TZ_RAW 时 timestamp 保存原始字符串
+    - blob / size: 图片的 git blob SHA（20 字节）与字节数，旧索引中没有时为 None
+    """
+    __slots__ = ("id", "path", "uploaders", "timestamp", "tz_offset", "blob", "size")
+
+    def __init__(self, entry_id: int, path: str, uploaders: Tuple[int, ...], timestamp, tz_offset: int,
+                 blob: Optional[bytes] = None, size: Optional[int] = None):
+        self.id = entry_id
+        self.path = path
+        self.uploaders = uploaders
+        self.timestamp = timestamp
+        self.tz_offset = tz_offset
+        self.blob = blob
+        self.size = size
+
+    @classmethod
+    def from_binary(cls, binary: BinaryIndex, i: int) -> "Entry":
+        """从 mmap 的二进制索引解码第 i 条，uploaders 即二进制索引中的作者 id"""
+        entry_id, path_sid, start, count, tz_offset, timestamp, *blob_info = binary.record(i)
+        if tz_offset == TZ_RAW:
+            timestamp = binary.string(timestamp)
+        blob, size = None, None
+        if blob_info and blob_info[0] != NO_BLOB:
+            blob, size = blob_info
+        return cls(entry_id, binary.string(path_sid), binary.uploader_ids(start, count), timestamp, tz_offset, blob, size)
+
+    @classmethod
+    def from_index_item(cls, key, item: List, table: AuthorTable) -> "Entry":
+        tz_offset, timestamp = encode_commit_time(item[2] if len(item) > 2 else None, lambda raw: raw)
+        blob, size = None, None
+        if len(item) > 4 and item[3]:
+            try:
+                blob, size = bytes.fromhex(item[3]), int(item[4])
+            except (TypeError, ValueError):
+                pass
+        return cls(int(key), item[0], table.intern_group(item[1]), timestamp, tz_offset, blob, size)
+
+    @property
+    def blob_sha(self) -> Optional[str]:
+        return self.blob.hex() if self.blob is not None else None
+
+    def upload_time(self) -> Optional[str]:
+        """还原为索引中的 ISO 时间字符串"""
+        if self.tz_offset == TZ_NONE:
+            return None
+        if self.tz_offset == TZ_RAW:
+            return self.timestamp
+        return decode_commit_time(self.tz_offset, self.timestamp)
+
+    def author_names(self, table: AuthorTable) -> List[str]:
+        return [table.authors[aid][0] for aid in self.uploaders]
+
+    def to_index_item(self, table: AuthorTable) -> List:
+        item = [self.path, [list(table.authors[aid]) for aid in self.uploaders], self.upload_time()]
+        if self.blob is not None:
+            item += [self.blob_sha, self.size]
+        return item
+
+
+class BinaryEntries(Sequence):
+    """把 mmap 的二进制索引包装成 Entry 序列，按下标现解码，多个进程共享同一份页缓存"""
+
+    def __init__(self, binary: BinaryIndex):
+        self.binary = binary
+
+    def __len__(self) -> int:
+        return len(self.binary)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        return Entry.from_binary(self.binary, i)
+
+
+class BinaryAuthorTable:
+    """与 AuthorTable 接口一致的只读作者表，authors[aid] 从二进制索引中读取"""
+    __slots__ = ("binary", "authors")
+
+    def __init__(self, binary: BinaryIndex):
+        self.binary = binary
+        self.authors = self
+
+    def __len__(self) -> int:
+        return self.binary.author_count
+
+    def __getitem__(self, aid: int) -> Tuple[str, str]:
+        return tuple(self.binary.author(aid))
+
+
+MAINTAINER = "CuteDress"
+
+
+def first_author_name(uploader_list: Sequence) -> Optional[str]:
+    """
+    首次作者：提交者列表（最新在前，最早在后）中最早的非 CuteDress 提交者，
+    全部是 CuteDress 时取列表最后一个；列表为空返回 None
+    """
+    if not uploader_list:
+        return None
+    author_name = uploader_list[-1][0]  # 👈 首次作者一般是列表最后一个
+    for name in uploader_list:
+        if name[0] != MAINTAINER:
+            author_name = name[0]
+    return author_name
+
+
+def _entry_timestamp(entry: Entry) -> float:
+    """条目最新提交时间的 epoch 秒，无时间或无法解析时为 NaN（原始字符串不带时区按 UTC）"""
+    if entry.tz_offset == TZ_NONE:
+        return math.nan
+    if entry.tz_offset != TZ_RAW:
+        return float(entry.timestamp)
+    try:
+        parsed = datetime.fromisoformat(str(entry.timestamp).replace('Z', '+00:00'))
+    except ValueError:
+        return math.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class EntryFilter:
+    """
+    按条件筛选条目：首次作者、路径前缀、最新提交时间区间 [after, before)（epoch 秒）
+    路径前缀中的 '#' 按索引中的写法转义为 '%23'
+    """
+    __slots__ = ("author", "prefix", "after", "before")
+
+    def __init__(self, author: Optional[str] = None, prefix: Optional[str] = None,
+                 after: Optional[float] = None, before: Optional[float] = None):
+        self.author = author
+        self.prefix = prefix.replace("#", "%23") if prefix else None
+        self.after = after
+        self.before = before
+
+    def __bool__(self) -> bool:
+        return self.author is not None or self.prefix is not None or self.after is not None or self.before is not None
+
+
+class SecondaryIndexes:
+    """
+    一代索引上的二级索引，供按条件随机抽取与搜索使用，每代只构建一次
+    - by_time / times_sorted: 按提交时间升序的条目下标及时间戳，bisect 取时间区间（无时间的条目不在其中）
+    - by_path / paths_sorted: 按路径排序的条目下标及路径，bisect 取前缀区间
+    - postings: 首次作者 → 条目下标（按提交时间升序，无时间的在前）
+    每个条件都能在 O(log n) 内得到一段候选，筛选时只在最小的一段里抽取或遍历
+    """
+    __slots__ = ("times", "paths", "author_ids", "author_names", "by_time", "times_sorted",
+                 "by_path", "paths_sorted", "postings")
+
+    # 拒绝采样的最少尝试次数，不足以抽满时退回遍历最小候选段
+    MIN_ATTEMPTS = 32
+
+    def __init__(self, entries: Sequence[Entry], table):
+        self.times = array("d")
+        self.paths: List[str] = []
+        self.author_ids = array("i")
+        self.author_names: List[str] = []
+        name_ids: Dict[str, int] = {}
+        group_names: Dict[Tuple[int, ...], int] = {}
+        for entry in entries:
+            self.paths.append(entry.path)
+            self.times.append(_entry_timestamp(entry))
+            group = tuple(entry.uploaders)
+            aid = group_names.get(group)
+            if aid is None:
+                name = first_author_name([table.authors[uid] for uid in group]) or ""
+                aid = name_ids.get(name)
+                if aid is None:
+                    aid = name_ids[name] = len(self.author_names)
+                    self.author_names.append(name)
+                group_names[group] = aid
+            self.author_ids.append(aid)
+
+        count = len(self.paths)
+        untimed = [p for p in range(count) if math.isnan(self.times[p])]
+        order = sorted((p for p in range(count) if not math.isnan(self.times[p])), key=self.times.__getitem__)
+        self.by_time = array("i", order)
+        self.times_sorted = array("d", (self.times[p] for p in order))
+        order = sorted(range(count), key=self.paths.__getitem__)
+        self.by_path = array("i", order)
+        self.paths_sorted = [self.paths[p] for p in order]
+        postings: Dict[str, array] = {}
+        for p in untimed + list(self.by_time):
+            postings.setdefault(self.author_names[self.author_ids[p]], array("i")).append(p)
+        self.postings = postings
+
+    def _candidates(self, flt: EntryFilter) -> List[Tuple[str, Sequence[int], int, int]]:
+        """每个条件对应的候选段 (种类, 下标数组, lo, hi)"""
+        ranges = []
+        if flt.after is not None or flt.before is not None:
+            lo = 0 if flt.after is None else bisect_left(self.times_sorted, flt.after)
+            hi = len(self.times_sorted) if flt.before is None else bisect_left(self.times_sorted, flt.before)
+            ranges.append(("time", self.by_time, lo, max(lo, hi)))
+        if flt.prefix is not None:
+            lo = bisect_left(self.paths_sorted, flt.prefix)
+            hi = bisect_left(self.paths_sorted, flt.prefix + "\U0010ffff")
+            ranges.append(("path", self.by_path, lo, hi))
+        if flt.author is not None:
+            posting = self.postings.get(flt.author, ())
+            ranges.append(("author", posting, 0, len(posting)))
+        return ranges
+
+    def _predicate(self, flt: EntryFilter, skip: str):
+        """除已由候选段保证的条件 skip 之外，其余条件的逐条检查"""
+        checks = []
+        if skip != "time" and (flt.after is not None or flt.before is not None):
+            after = -math.inf if flt.after is None else flt.after
+            before = math.inf if flt.before is None else flt.before
+            # NaN 的比较结果都为 False，无时间的条目自然被排除
+            checks.append(lambda p: after <= self.times[p] < before)
+        if skip != "path" and flt.prefix is not None:
+            checks.append(lambda p: self.paths[p].startswith(flt.prefix))
+        if skip != "author" and flt.author is not None:
+            checks.append(lambda p: self.author_names[self.author_ids[p]] == flt.author)
+        return lambda p: all(check(p) for check in checks)
+
+    def sample(self, flt: EntryFilter, count: int) -> List[int]:
+        """
+        不放回地随机抽取最多 count 个满足条件的条目下标
+        在最小候选段内拒绝采样；命中率太低或候选太少时遍历该段后抽取
+        """
+        kind, seq, lo, hi = min(self._candidates(flt), key=lambda c: c[3] - c[2])
+        if hi <= lo:
+            return []
+        accept = self._predicate(flt, kind)
+        picked: Dict[int, None] = {}
+        if hi - lo > count:
+            for _ in range(max(self.MIN_ATTEMPTS, count * 8)):
+                p = seq[random.randrange(lo, hi)]
+                if p not in picked and accept(p):
+                    picked[p] = None
+                    if len(picked) == count:
+                        return list(picked)
+        matches = [p for p in seq[lo:hi] if accept(p)]
+        return random.sample(matches, min(count, len(matches)))
+
+    def search(self, flt: EntryFilter, sort: str = "latest_commit_time") -> List[int]:
+        """
+        满足条件的全部条目下标，sort 为 latest_commit_time（最新在前，无时间的在后）或 path
+        只遍历最小的候选段；候选段本身已按所需顺序排列时不再排序
+        """
+        if not flt:
+            if sort == "path":
+                return list(self.by_path)
+            untimed = [p for p in range(len(self.paths)) if math.isnan(self.times[p])]
+            return list(reversed(self.by_time)) + untimed
+        kind, seq, lo, hi = min(self._candidates(flt), key=lambda c: c[3] - c[2])
+        accept = self._predicate(flt, kind)
+        matches = [p for p in seq[lo:hi] if accept(p)]
+        if sort == "path":
+            if kind != "path":
+                matches.sort(key=self.paths.__getitem__)
+            return matches
+        if kind in ("time", "author"):
+            # 两种候选段都是按时间升序（postings 中无时间的在最前）
+            timed = [p for p in matches if not math.isnan(self.times[p])]
+            return timed[::-1] + [p for p in matches if math.isnan(self.times[p])]
+        timed = sorted((p for p in matches if not math.isnan(self.times[p])), key=self.times.__getitem__, reverse=True)
+        return timed + [p for p in matches if math.isnan(self.times[p])]
+
+
+class IndexGeneration:
+    """
+    一代只读索引数据，构建完成后不再修改
+    - entries: 可直接随机抽取的 Entry 数组（不依赖 id 连续）
+    - author_table: 条目引用的上传者驻留表
+    - blobs: blob SHA（20 字节）→ Entry，用于内容寻址的图片 URL
+    - payloads: 两个索引文件预编码后的响应体，按文件名索引
+    - authors: 作者名 → AuthorImages；authors_payload: 作者列表（名称与图片数）
+    - secondary: 按作者 / 路径前缀 / 时间筛选用的 SecondaryIndexes，首次使用时构建
+    - entry_body: 随机接口单个条目预渲染的响应体，每个条目在本代首次被抽中时渲染一次
+    原始的 index_0 / index_1 字典在编码后即丢弃，需要时用 to_index_0 还原，或用 iter_lines 逐行导出
+    多进程部署时，非主进程用 from_shared 从主进程写出的文件映射出同样接口的一代
+    """
+    __slots__ = ("number", "entries", "author_table", "blobs", "loaded_at", "payloads",
+                 "authors", "authors_payload", "_author_offsets", "_secondary", "_entry_bodies")
+
+    def __init__(self, number: int, index_0: Dict, index_1: Dict):
+        self.number = number
+        self.author_table = AuthorTable()
+        # 跳过的条目会让 id 出现空洞，这里只保留有效条目组成连续数组
+        self.entries: Tuple[Entry, ...] = tuple(
+            Entry.from_index_item(key, item, self.author_table)
+            for key, item in index_0.items()
+            if isinstance(item, list) and len(item) >= 2 and item[0]
+        )
+        self.blobs: Dict[bytes, Entry] = {entry.blob: entry for entry in self.entries if entry.blob is not None}
+        self.loaded_at = time.time()
+        self.payloads: Dict[str, EncodedPayload] = {
+            "index_0.json": EncodedPayload.from_obj(index_0, self.loaded_at),
+            "index_1.json": EncodedPayload.from_obj(index_1, self.loaded_at),
+        }
+        self._author_offsets: Optional[List[int]] = None
+        self._secondary: Optional[SecondaryIndexes] = None
+        self._entry_bodies: Optional[List[Optional[Tuple[bytes, Optional[bytes]]]]] = None
+        self.authors: Dict[str, AuthorImages] = build_authors(index_1)
+        listing = sorted(self.authors.values(), key=lambda a: (-len(a), a.name))
+        self.authors_payload = EncodedPayload.from_obj(
+            {"total": len(listing), "authors": [{"name": a.name, "count": len(a)} for a in listing]},
+            self.loaded_at
+        )
+
+    @classmethod
+    def from_shared(cls, number: int, binary: BinaryIndex, payloads: Dict[str, EncodedPayload],
+                    authors_payload: EncodedPayload, authors: Dict[str, AuthorImages],
+                    loaded_at: float) -> "IndexGeneration":
+        """
+        由共享文件组装一代：条目按需从 mmap 的二进制索引解码，响应体直接引用 mmap 的文件，
+        作者图片表通常为 map_author_images 映射出的共享表
+        """
+        generation = cls.__new__(cls)
+        generation.number = number
+        generation.entries = BinaryEntries(binary)
+        generation.author_table = BinaryAuthorTable(binary)
+        generation.blobs = None
+        generation.loaded_at = loaded_at
+        generation.payloads = payloads
+        generation.authors_payload = authors_payload
+        generation.authors = authors
+        generation._author_offsets = None
+        generation._secondary = None
+        generation._entry_bodies = None
+        return generation
+
+    def to_index_0(self) -> Dict[str, List]:
+        """还原为 index_0 字典（供增量更新使用）"""
+        return {str(entry.id): entry.to_index_item(self.author_table) for entry in self.entries}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _offsets(self) -> List[int]:
+        """index_1 按行展开后，每个作者第一张图片所在的行号"""
+        if self._author_offsets is None:
+            offsets, total = [], 0
+            for images in self.authors.values():
+                offsets.append(total)
+                total += len(images)
+            offsets.append(total)
+            self._author_offsets = offsets
+        return self._author_offsets
+
+    def line_count(self, name: str) -> int:
+        """name 对应索引按 NDJSON 展开后的行数"""
+        return len(self.entries) if name == "index_0.json" else self._offsets()[-1]
+
+    def iter_lines(self, name: str, start: int = 0, stop: Optional[int] = None) -> Iterator[bytes]:
+        """
+        逐行产出 name 对应索引的 NDJSON 行（见 ndjson_line），只渲染 [start, stop) 范围
+        行号在同一代内稳定，可用作分页游标
+        """
+        stop = self.line_count(name) if stop is None else min(stop, self.line_count(name))
+        if name == "index_0.json":
+            for i in range(start, stop):
+                entry = self.entries[i]
+                yield ndjson_line(str(entry.id), entry.to_index_item(self.author_table))
+            return
+        offsets = self._offsets()
+        authors = list(self.authors.values())
+        k = bisect_right(offsets, start) - 1
+        line = start
+        while line < stop and k < len(authors):
+            images = authors[k].orders[None]
+            for item in images[line - offsets[k]:stop - offsets[k]]:
+                yield b"[" + authors[k].key + b"," + item + b"]"
+            line = offsets[k + 1]
+            k += 1
+
+    def find_blob(self, blob_sha: str) -> Optional[Entry]:
+        if self.blobs is None:
+            self.blobs = {entry.blob: entry for entry in self.entries if entry.blob is not None}
+        try:
+            return self.blobs.get(bytes.fromhex(blob_sha))
+        except ValueError:
+            return None
+
+    def random_entry(self) -> Entry:
+        return random.choice(self.entries)
+
+    def random_positions(self, count: int = 1, flt: Optional[EntryFilter] = None) -> List[int]:
+        """
+        不放回抽取最多 count 个互不重复的条目下标，数量超过总数时返回全部（顺序随机）
+        带筛选条件时只在满足条件的条目中抽取，没有满足条件的条目时返回空列表
+        """
+        if flt:
+            return self.secondary.sample(flt, count)
+        if count == 1 and self.entries:
+            return [random.randrange(len(self.entries))]
+        return random.sample(range(len(self.entries)), min(count, len(self.entries)))
+
+    def entry_body(self, i: int, render: Callable[[Entry], Tuple[bytes, Optional[bytes]]], base: bytes) -> bytes:
+        """
+        第 i 个条目预渲染的响应体，在 base_url 处拼入 base
+        render 把条目渲染为 (前段, 后段)，响应体不含 base_url 时后段为 None；同一代内须总是传入同一个 render
+        """
+        bodies = self._entry_bodies
+        if bodies is None:
+            bodies = self._entry_bodies = [None] * len(self.entries)
+        parts = bodies[i]
+        if parts is None:
+            parts = bodies[i] = render(self.entries[i])
+        head, tail = parts
+        return head if tail is None else head + base + tail
+
+    @property
+    def secondary(self) -> SecondaryIndexes:
+        # 并发的首次请求可能各自构建一次，结果相同，后赋值的生效
+        if self._secondary is None:
+            self._secondary = SecondaryIndexes(self.entries, self.author_table)
+        return self._secondary
+
+    def search(self, flt: EntryFilter, sort: str = "latest_commit_time") -> List[int]:
+        """满足条件的条目在 entries 中的下标，按 sort 排序"""
+        return self.secondary.search(flt, sort)
+
+
+def build_authors(index_1: Dict) -> Dict[str, AuthorImages]:
+    return {
+        name: AuthorImages(name, items)
+        for name, items in index_1.items() if isinstance(items, list)
+    }
+
+
+class IndexStore:
+    """
+    常驻内存的索引存储
+    只在启动和同步后加载一次，新一代数据构建完成后整体替换引用，
+    请求处理期间拿到的 generation 不会被并发修改
+    """
+
+    def __init__(self):
+        self._current: Optional[IndexGeneration] = None
+        self._lock = threading.Lock()
+        self._number = 0
+        # 最近一次由原始数据组装一代索引的耗时（秒）
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def current(self) -> Optional[IndexGeneration]:
+        return self._current
+
+    def publish(self, index_0: Dict, index_1: Optional[Dict] = None) -> IndexGeneration:
+        """用新的索引数据生成新一代并原子替换"""
+        with self._lock:
+            self._number += 1
+            start = time.perf_counter()
+            generation = IndexGeneration(self._number, index_0 or {}, index_1 or {})
+            self.load_seconds = time.perf_counter() - start
+            self._current = generation
+        logging.info(f"索引已加载: 第 {generation.number} 代，共 {len(generation)} 项")
+        return generation
+
+    def publish_generation(self, generation: IndexGeneration) -> IndexGeneration:
+        """直接替换为已组装好的一代（如从共享文件映射的），沿用其代号"""
+        with self._lock:
+            self._number = max(self._number, generation.number)
+            self._current = generation
+        logging.info(f"索引已切换: 第 {generation.number} 代，共 {len(generation)} 项")
+        return generation
+
+    def load_files(self, public_dir: Union[str, Path] = "public") -> IndexGeneration:
+        """
+        从 public 目录读取 index_0.json / index_1.json 并发布
+        index_0.json 不存在时抛出 FileNotFoundError；index_1.json 缺失时作者索引为空
+        """
+        public_dir = Path(public_dir)
+        with open(public_dir / "index_0.json", "r", encoding="utf-8") as f:
+            index_0 = json.load(f)
+        try:
+            with open(public_dir / "index_1.json", "r", encoding="utf-8") as f:
+                index_1 = json.load(f)
+        except FileNotFoundError:
+            logging.warning(f"{public_dir / 'index_1.json'} 不存在，作者索引为空")
+            index_1 = {}
+        return self.publish(index_0, index_1)
@@ -1,34 +1,52 @@
+import time
+STARTUP_STARTED = time.perf_counter()
 import os
 from pathlib import Path as p_pathlib
-import subprocess
-import random
 import json
-from typing import Annotated
-import httpx
-import colorama
-from colorama import Fore, Style
+import base64
+from datetime import datetime, timezone
+from functools import partial
+from typing import Annotated, Literal, Optional, Tuple
 import uvicorn
 import logging
 from dotenv import load_dotenv
-from git import Repo
 import asyncio
-import json
-from fastapi import FastAPI, Response, Request, BackgroundTasks, HTTPException, Header, Query,Path
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Response, Request, HTTPException, Header, Query,Path
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
-from urllib.parse import urljoin, urlparse
-from httpx import TimeoutException
+from urllib.parse import quote
 from contextlib import asynccontextmanager  # 添加这个导入
 from dress_tools import (
     build_index,
-    build_index_by_author,
     convert_index_id_to_index_author,
     escape_hash_in_index,
-    normalize_url,
-    get_all_committers,
-    get_dress_image_paths,
     run_git_pull,
-    get_github_index
+    get_head_sha,
+    open_repo,
+    read_index_meta,
+    write_index_meta,
+    write_json_atomic,
+    update_index
+)
+from index_store import Entry, EntryFilter, IndexGeneration, IndexStore
+from index_binary import write_binary_index
+from http_cache import encoded_response, etag_matches, streamed_lines_response
+from remote_index import REMOTE_INDEX_FILES, remote_cache, remote_fetcher
+from admission import AdmissionMiddleware
+from health_probe import connectivity_prober
+from image_derivatives import DEFAULT_FORMATS, FORMATS, cached_blob_sha, derivative_cache
+from shared_index import load_shared_generation, read_manifest, write_shared_generation
+from sync_leader import SyncLeader, request_sync, take_sync_request
+from sync_jobs import SyncJob, SyncJobManager
+from metrics import (
+    AUTO_SYNC_DURATION,
+    AUTO_SYNC_LAST_SUCCESS,
+    AUTO_SYNC_RUNS,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    INDEX_BUILD_PHASE_DURATION,
+    Gauge,
+    MetricsMiddleware,
+    render as render_metrics
 )
 
 API_KEY = "admin"
@@ -37,7 +55,6 @@ log_level = "INFO"
 auto_sync_enabled = "true"
 auto_sync_time = 86400  # 默认24小时
 minimum_mode = "false"
-http_client = httpx.AsyncClient()
 if os.environ.get("API_KEY") and os.environ.get("PORTS") and os.environ.get("LOG_LEVEL") and os.environ.get("AUTO_SYNC") and os.environ.get("AUTO_SYNC_TIME") and os.environ.get("FORCE_MINING") and os.environ.get("FORCE_REMOTE"):
     API_KEY = os.environ.get("API_KEY")
     ports = int(os.environ.get("PORTS"))  # 确保转换为整数
@@ -64,6 +81,14 @@ else:
     else:
         raise RuntimeError("请在 .env 文件中设置 API_KEY")
 
+# 启动时最多等待这么久加载磁盘上的索引，超时则先开始服务，索引在后台继续加载
+STARTUP_INDEX_BUDGET = float(os.environ.get("STARTUP_INDEX_BUDGET") or 5)
+
+# 多进程部署：WORKERS > 1 时由文件锁选出的主进程负责同步，其余进程映射主进程写出的共享索引
+workers = int(os.environ.get("WORKERS") or 1)
+multi_worker = workers > 1
+INDEX_POLL_INTERVAL = float(os.environ.get("INDEX_POLL_INTERVAL") or 2)
+
 # 安全地设置日志级别，处理None值和无效值
 if log_level is None:
     log_level = "INFO"
@@ -82,44 +107,270 @@ BASE_DIR = p_pathlib(__file__).resolve().parent
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
 
 
+index_store = IndexStore()
+sync_leader = SyncLeader()
+
+
+def _generation_value(getter):
+    """抓取时读取当前这一代索引的属性，尚未加载时不输出"""
+    def read():
+        generation = index_store.current
+        return None if generation is None else getter(generation)
+    return read
+
+
+Gauge("dress_index_generation", "当前索引代号", function=_generation_value(lambda g: g.number))
+Gauge("dress_index_entries", "当前索引的图片数", function=_generation_value(len))
+Gauge("dress_index_loaded_timestamp_seconds", "当前索引的加载时间", function=_generation_value(lambda g: g.loaded_at))
+Gauge("dress_index_load_duration_seconds", "最近一次组装内存索引的耗时", function=lambda: index_store.load_seconds)
+STARTUP_DURATION = Gauge("dress_startup_duration_seconds", "从导入 main 到开始服务的耗时")
+
+def load_remote_cache() -> bool:
+    """发布磁盘上缓存的远端索引，供启动时立即提供服务，成功返回 True"""
+    try:
+        index_0, index_1 = remote_cache.load(REMOTE_INDEX_FILES)
+    except FileNotFoundError:
+        return False
+    except json.JSONDecodeError as e:
+        logging.error(f"远端索引缓存格式错误: {e}")
+        return False
+    index_store.publish(index_0, index_1)
+    logging.info("已加载远端索引缓存，将在后台刷新")
+    return True
+
+
 if not os.path.exists("Dress") and minimum_mode != "true":
     logging.info("未在当前目录发现Dress仓库，将以最小化API运行")
     minimum_mode = "true"
-    try:
-        data = asyncio.run(get_github_index())
-    except Exception as e:
-        logging.error(f"获取远端数据失败: {e}")
-        raise RuntimeError("无法连接到远程服务器获取数据")
 elif minimum_mode == "true":
     # 即使存在Dress目录，如果用户强制设置为最小化模式，也要使用远程数据
     logging.info("强制使用最小化API运行模式")
+
+def write_index_files(index_0: dict, index_1: dict, head: Optional[str] = None):
+    """
+    写入 public/index_*.json、二进制索引及其对应的 Dress HEAD，并发布为新一代内存索引
+    每个文件都先写临时文件再替换，读取方不会看到写了一半的内容
+    """
+    write_json_atomic("public/index_0.json", index_0)
+    write_json_atomic("public/index_1.json", index_1)
+    write_binary_index(index_0, "public/index_0.bin")
+    write_index_meta("public", head)
+    generation = index_store.publish(index_0, index_1)
+    if multi_worker:
+        write_shared_generation(generation)
+
+
+async def rebuild_local_index(job: Optional[SyncJob] = None):
+    """
+    基于本地 Dress 仓库重建两个索引，已有索引时只增量重算上次构建后变化的图片
+    由同步任务调用时，写出并发布前进入 publish 阶段，此前请求的取消在这里生效
+    """
+    repo = await asyncio.to_thread(open_repo, "Dress")
+    head = await asyncio.to_thread(get_head_sha, repo.working_dir)
+    built_head = read_index_meta("public").get("head")
+    generation = index_store.current
+    index = None
+    if head and built_head and generation is not None:
+        if built_head == head:
+            logging.info(f"索引已对应 Dress@{head[:8]}，无需重建")
+            return
+        index = await update_index(repo, generation.to_index_0(), built_head)
+    if index is None:
+        index = await build_index(repo)
+        with INDEX_BUILD_PHASE_DURATION.time("rebuild_local_index", "escape"):
+            index = escape_hash_in_index(index, "url")
+    with INDEX_BUILD_PHASE_DURATION.time("rebuild_local_index", "convert"):
+        index_by_author = await convert_index_id_to_index_author(index)
+        index_by_author = escape_hash_in_index(index_by_author, "author")
+    if job is not None:
+        job.enter("publish")
+    with INDEX_BUILD_PHASE_DURATION.time("rebuild_local_index", "write"):
+        await asyncio.to_thread(write_index_files, index, index_by_author, head)
+
+
+async def sync_remote_index(job: Optional[SyncJob] = None):
+    """从远端条件请求预构建的两个索引，均未变化（304）时跳过解析与写入；publish 阶段同 rebuild_local_index"""
+    changed = await asyncio.gather(*(remote_cache.refresh(name) for name in REMOTE_INDEX_FILES))
+    if not any(changed) and index_store.current is not None and not read_index_meta("public").get("head"):
+        logging.debug("远端索引未变化，跳过同步")
+        return
+    index_id, index_author = await asyncio.to_thread(remote_cache.load, REMOTE_INDEX_FILES)
+    if job is not None:
+        job.enter("publish")
+    await asyncio.to_thread(write_index_files, index_id, index_author)
+    logging.debug(f"已从GitHub获取最新数据，共{len(index_id)}项数据)")
+
+
+async def run_sync_job(job: SyncJob):
+    """
+    同步任务的执行函数，由 sync_jobs 保证同一时刻只有一个在运行
+    最小化或强制远端模式刷新远端索引（强制远端模式仍会先拉取仓库），否则按需拉取并重建本地索引
+    本地重建时拉取失败即抛出异常，任务以 git 的错误输出失败；远端索引不依赖本地仓库，
+    拉取失败只把错误记在任务上，继续刷新远端索引。索引未变化时跳过 publish 阶段
+    """
+    remote = minimum_mode == "true" or force_remote_index == "true"
+    pull = job.pull and minimum_mode != "true"
+    job.phases = (["pull"] if pull else []) + (["remote"] if remote else ["index"] if job.rebuild_index else [])
+    if remote or job.rebuild_index:
+        job.phases.append("publish")
+    if pull:
+        job.enter("pull")
+        try:
+            await asyncio.to_thread(run_git_pull)
+        except RuntimeError as e:
+            if not remote:
+                raise
+            job.error = str(e)
+            logging.warning(f"同步任务 {job.id} 拉取失败，继续刷新远端索引: {e}")
+    if remote:
+        job.enter("remote")
+        await sync_remote_index(job)
+    elif job.rebuild_index:
+        job.enter("index")
+        await rebuild_local_index(job)
+
+
+sync_jobs = SyncJobManager(run_sync_job)
+
+
+def load_last_good_index():
+    """
+    加载磁盘上最近一次成功写出的索引，不访问网络
+    最小化模式优先使用远端索引缓存，其次是 public 下的索引文件；都没有时等待后台同步
+    """
+    if index_store.current is not None:
+        return
+    if minimum_mode == "true" and load_remote_cache():
+        return
     try:
-        data = asyncio.run(get_github_index())
-    except Exception as e:
-        logging.error(f"获取远端数据失败: {e}")
-        raise RuntimeError("无法连接到远程服务器获取数据")
-else:
-    # 在非最小化模式下，也需要初始化data变量，以防万一需要使用
-    data = None
+        index_store.load_files("public")
+    except FileNotFoundError:
+        logging.warning("本地索引文件不存在，等待后台同步后加载")
+    except json.JSONDecodeError as e:
+        logging.error(f"本地索引文件格式错误: {e}")
 
-@asynccontextmanager
-async def auto_sync_on_start(app: FastAPI):
+
+async def initial_sync():
+    """
+    未开启自动同步时的一次性启动同步：最小化或强制远端模式刷新远端索引，
+    本地模式只在没有可用索引时基于 Dress 仓库构建
+    """
+    if minimum_mode == "true" or force_remote_index == "true":
+        job, _ = sync_jobs.submit("startup", pull=False, rebuild_index=False)
+    elif index_store.current is None:
+        logging.info("没有可用的索引，开始在后台构建")
+        job, _ = sync_jobs.submit("startup", pull=False, rebuild_index=True)
+    else:
+        return
+    await job.wait()
+
+
+def start_sync_tasks() -> list:
+    """启动同步相关的后台任务；多进程部署时只在同步主进程中调用"""
+    tasks = []
     # 启动自动同步任务
     if auto_sync_enabled == "true":
         logging.info(f"启动自动同步任务,同步间隔{auto_sync_time}秒")
-        sync_task = asyncio.create_task(auto_sync())
-        try:
-            yield
-        finally:
-            sync_task.cancel()
+        tasks.append(asyncio.create_task(auto_sync()))
     else:
+        tasks.append(asyncio.create_task(initial_sync()))
+    return tasks
+
+
+async def coordinate_workers():
+    """
+    多进程部署时每个工作进程都运行：
+    抢到文件锁的进程成为同步主进程，启动同步任务并处理其他进程转交的同步请求；
+    其余进程轮询共享索引的 current.json，切换到主进程发布的新一代
+    主进程退出后锁自动释放，由下一个抢到锁的进程接替
+    """
+    sync_tasks = []
+    loaded_token = None
+    try:
+        while True:
+            if not sync_leader.is_leader and await asyncio.to_thread(sync_leader.try_acquire):
+                logging.info(f"进程 {os.getpid()} 成为同步主进程")
+                manifest = await asyncio.to_thread(read_manifest)
+                generation = index_store.current
+                # 共享索引不是本进程正在使用的这一代（如首次启动）时，以本进程的为准重新写出
+                if generation is not None and (manifest is None or manifest["token"] != loaded_token):
+                    await asyncio.to_thread(write_shared_generation, generation)
+                sync_tasks = start_sync_tasks()
+            if sync_leader.is_leader:
+                request = await asyncio.to_thread(take_sync_request)
+                if request is not None:
+                    sync_jobs.submit("worker", pull=True, rebuild_index=bool(request.get("rebuild_index")))
+            else:
+                manifest = await asyncio.to_thread(read_manifest)
+                if manifest is not None and manifest["token"] != loaded_token:
+                    try:
+                        generation = await asyncio.to_thread(load_shared_generation, manifest)
+                    except (FileNotFoundError, KeyError, ValueError) as e:
+                        logging.warning(f"加载共享索引失败，稍后重试: {e}")
+                    else:
+                        index_store.publish_generation(generation)
+                        loaded_token = manifest["token"]
+            await asyncio.sleep(INDEX_POLL_INTERVAL)
+    finally:
+        for task in sync_tasks:
+            task.cancel()
+        sync_leader.release()
+
+
+async def run_background(loaded: asyncio.Event):
+    """后台加载磁盘上的索引，加载完成后才开始同步，避免在索引读出之前重复构建"""
+    sync_tasks = []
+    try:
+        await asyncio.to_thread(load_last_good_index)
+        loaded.set()
+        if multi_worker:
+            await coordinate_workers()
+        else:
+            sync_tasks = start_sync_tasks()
+            await asyncio.gather(*sync_tasks)
+    finally:
+        for task in sync_tasks:
+            task.cancel()
+
+
+@asynccontextmanager
+async def auto_sync_on_start(app: FastAPI):
+    """
+    启动时不访问网络、不构建索引：最多等待 STARTUP_INDEX_BUDGET 秒加载磁盘上的索引就开始服务，
+    远端同步与索引构建都在后台进行
+    """
+    loaded = asyncio.Event()
+    tasks = [asyncio.create_task(run_background(loaded)), asyncio.create_task(connectivity_prober.run())]
+    try:
+        await asyncio.wait_for(loaded.wait(), STARTUP_INDEX_BUDGET)
+    except asyncio.TimeoutError:
+        logging.warning(f"{STARTUP_INDEX_BUDGET} 秒内未能加载索引，先开始服务，索引在后台继续加载")
+    STARTUP_DURATION.set(time.perf_counter() - STARTUP_STARTED)
+    logging.info(f"启动耗时 {time.perf_counter() - STARTUP_STARTED:.2f} 秒")
+    try:
         yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        sync_jobs.shutdown()
+        await remote_fetcher.aclose()
+        derivative_cache.shutdown()
 app = FastAPI(
     title="Dress-API：面向可爱男孩子的一个API",
     terms_of_service="https://creativecommons.org/licenses/by-nc-sa/4.0/",
     description="“本服务所使用的图片来自 [Cute-Dress/Dress](https://github.com/Cute-Dress/Dress)，遵循 CC BY-NC-SA 4.0 许可。”",
     lifespan=auto_sync_on_start  # 添加生命周期管理器
 )
+# 后添加的中间件在外层：指标统计包住准入控制，被拒绝的请求也会计入
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+async def auto_sync_once() -> bool:
+    """执行一轮自动同步（已有同步任务在运行时并入它），失败只记录日志，返回是否成功"""
+    job, _ = sync_jobs.submit("auto", pull=True, rebuild_index=True)
+    await job.wait()
+    return job.status == "succeeded"
+
 
 async def auto_sync():
     """
@@ -128,290 +379,440 @@ async def auto_sync():
     if auto_sync_enabled == "true":
         while True: 
             # 使用无限循环替代单次sleep
-            
-            if minimum_mode != "true":
-                logging.info("开始执行本地Dress仓库同步...")
-                await asyncio.to_thread(run_git_pull)  # run_git_pull 不是异步函数
-                if force_remote_index == "true":
-                    index_id = await get_github_index("index_0.json")
-                    index_author = await get_github_index("index_1.json")
-                    with open("public/index_0.json", "w", encoding="utf-8") as f:
-                        json.dump(index_id, f, ensure_ascii=False, indent=4)
-                    with open("public/index_1.json", "w", encoding="utf-8") as f:
-                        json.dump(index_author, f, ensure_ascii=False, indent=4)
-                else:
-                    try:
-                        repo = Repo("Dress")
-                        index = build_index(repo)
-                        index = escape_hash_in_index(index, "url")
-                        with open("public/index_0.json", "w", encoding="utf-8") as f:
-                            json.dump(index, f, ensure_ascii=False, indent=4)
-                        
-                        index_by_author = convert_index_id_to_index_author(index)
-                        index_by_author = escape_hash_in_index(index_by_author, "author")
-                        with open("public/index_1.json", "w", encoding="utf-8") as f:
-                            json.dump(index_by_author, f, ensure_ascii=False, indent=4)
-                        logging.debug("本地Dress仓库同步完成")
-                    except FileNotFoundError as e:
-                        logging.error(f"Dress目录不存在: {e}")
-                    except PermissionError as e:
-                        logging.error(f"权限不足: {e}")
-                    except Exception as e:
-                        logging.error(f"自动同步时构建索引失败: {e}")
-            else:
-                global data
-                logging.debug("开始执行远程数据同步...")
-                try:
-                    new_data = await get_github_index(index="index_0.json")
-                    data = new_data  # 确保更新全局变量
-                    index_1 = await get_github_index(index="index_1.json")
-                    with open("public/index_0.json", "w", encoding="utf-8") as f:
-                        json.dump(new_data, f, ensure_ascii=False, indent=4)
-                    with open("public/index_1.json", "w", encoding="utf-8") as f:
-                        json.dump(index_1, f, ensure_ascii=False, indent=4)
-                    logging.debug(f"已从GitHub获取最新数据，共{len(new_data)}项数据)")
-                except Exception as e:
-                    logging.error(f"远程数据同步失败: {e}")
+            with AUTO_SYNC_DURATION.time():
+                succeeded = await auto_sync_once()
+            AUTO_SYNC_RUNS.labels("success" if succeeded else "failure").inc()
+            if succeeded:
+                AUTO_SYNC_LAST_SUCCESS.set(time.time())
             await asyncio.sleep(auto_sync_time)  # 每10秒同步一次，便于观察
     else:
         pass  
 
 
 
+MAX_RANDOM_COUNT = 100
+DEFAULT_SEARCH_PAGE = 20
+MAX_SEARCH_PAGE = 100
+MIN_DERIVATIVE_WIDTH = 16
+MAX_DERIVATIVE_WIDTH = 2048
+
+
+def entry_image_url(entry: Entry, base_url) -> str:
+    """条目的图片地址：最小化模式指向 jsDelivr，本地模式有 blob SHA 时使用内容寻址的地址"""
+    if minimum_mode == "true":
+        return f"https://cdn.jsdelivr.net/gh/Cute-Dress/Dress@master/{entry.path}"
+    # 索引带 blob SHA 时返回内容寻址的地址，可被 CDN 永久缓存
+    if entry.blob is not None:
+        return f"{base_url}blob/{entry.blob_sha}/{entry.path}"
+    return f"{base_url}img/{entry.path}"
+
+
+def render_entry(generation: IndexGeneration, entry: Entry, base_url, thumb: Optional[int] = None) -> dict:
+    """把索引条目转换为随机接口返回的单项结构，thumb 为缩略图宽度（仅本地模式，未安装 Pillow 时忽略）"""
+    img_url = entry_image_url(entry, base_url)
+    author_names = entry.author_names(generation.author_table)
+    upload_time = entry.upload_time()
+    
+    if minimum_mode == "true":  # 修正：与"true"比较
+        return {"img_url": img_url, "img_author": f"{author_names}",
+                "upload_time": upload_time, "notice": "Cute-Dress/Dress CC-BY-NC-SA 4.0"}
+    else:
+        item = {"img_url":img_url,"img_author":f"{author_names}","upload_time": upload_time,"notice":"Cute-Dress/Dress CC BY-NC-SA 4.0"}
+        if thumb is not None and derivative_cache.available:
+            item["thumb_url"] = f"{img_url}?w={thumb}&fmt=webp"
+        return item
+
+
+# 预渲染响应体时代替 base_url 的占位，JSON 编码后再按它切成两段
+BASE_URL_MARK = "\x00base_url\x00"
+BASE_URL_MARK_JSON = json.dumps(BASE_URL_MARK)[1:-1].encode()
+
+
+def render_entry_parts(generation: IndexGeneration, entry: Entry) -> Tuple[bytes, Optional[bytes]]:
+    """
+    render_entry（不带缩略图）的 JSON 响应体，在 base_url 处切成 (前段, 后段)；最小化模式的地址不含 base_url，后段为 None
+    与 FastAPI 默认的 JSONResponse 编码方式一致
+    """
+    body = json.dumps(render_entry(generation, entry, BASE_URL_MARK),
+                      ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    head, mark, tail = body.partition(BASE_URL_MARK_JSON)
+    return (head, tail) if mark else (body, None)
+
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    """不带时区的时间按 UTC 处理"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def entry_filter(author: Optional[str], prefix: Optional[str],
+                 after: Optional[datetime], before: Optional[datetime]) -> EntryFilter:
+    return EntryFilter(author=author, prefix=prefix, after=_epoch(after), before=_epoch(before))
+
+
+AuthorQuery = Annotated[Optional[str], Query(description="只选该首次作者的图片")]
+PrefixQuery = Annotated[Optional[str], Query(description="只选路径以此开头的图片，如 S/")]
+AfterQuery = Annotated[Optional[datetime], Query(description="只选最新提交时间不早于此的图片（ISO 8601，不带时区按 UTC）")]
+BeforeQuery = Annotated[Optional[datetime], Query(description="只选最新提交时间早于此的图片（ISO 8601，不带时区按 UTC）")]
+
+
 @app.get("/dress/v1",summary="获取一张可爱男孩子的自拍")
-async def random_setu(request:Request):
+async def random_setu(
+    request:Request,
+    count: Annotated[Optional[int], Query(ge=1, le=MAX_RANDOM_COUNT, description="一次返回多张互不重复的图片，返回数组")] = None,
+    thumb: Annotated[Optional[int], Query(ge=MIN_DERIVATIVE_WIDTH, le=MAX_DERIVATIVE_WIDTH, description="附带该宽度的 WebP 缩略图地址 thumb_url（仅本地模式，需安装 Pillow）")] = None,
+    author: AuthorQuery = None,
+    prefix: PrefixQuery = None,
+    after: AfterQuery = None,
+    before: BeforeQuery = None
+):
     """
     你 GET 一下就行了
+    - author / prefix / after / before：只在满足条件的图片中随机，没有满足条件的图片时返回 404；
+      count 超过满足条件的数量时返回全部
     """
-    global data
     base_url =request.base_url
-    if minimum_mode == "true":
-        img_data = data
-    else:
-        try:
-            with open("public/index_0.json","r",encoding="utf-8") as f:
-                local_data = json.loads(f.read())
-                img_data = local_data
-        except FileNotFoundError:
-            raise HTTPException(status_code=500, detail="本地索引文件不存在")
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=500, detail="本地索引文件格式错误")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"读取本地索引文件时发生错误: {e}")
-    
-    if not img_data:
-        raise HTTPException(status_code=500, detail="图片数据为空")
-    
-    max_count = len(img_data.keys())
-    if max_count == 0:
+    generation = index_store.current
+    if generation is None:
+        raise HTTPException(status_code=500, detail="本地索引文件不存在")
+    if len(generation) == 0:
         raise HTTPException(status_code=500, detail="图片索引为空")
-    
-    img_key = random.randint(a=1,b=max_count)
-    entry = img_data[f"{img_key}"]
-    
-    img = entry[0]
-    uploader_info = entry[1]
-    author_names = [item[0] for item in uploader_info if item]
-    
-    # 检查是否存在时间信息
-    upload_time = None
-    if len(entry) > 2:
-        upload_time = entry[2]
-    
-    if minimum_mode == "true":  # 修正：与"true"比较
-        return {"img_url": f"https://cdn.jsdelivr.net/gh/Cute-Dress/Dress@master/{img}", "img_author": f"{author_names}",
-                "upload_time": upload_time, "notice": "Cute-Dress/Dress CC-BY-NC-SA 4.0"}
-    else:
-        return {"img_url":f"{base_url}img/{img}","img_author":f"{author_names}","upload_time": upload_time,"notice":"Cute-Dress/Dress CC BY-NC-SA 4.0"}
 
-@app.post("/dress/v1/sync", summary="同步远程 Dress 仓库")
+    flt = entry_filter(author, prefix, after, before)
+    positions = generation.random_positions(count or 1, flt)
+    if not positions:
+        raise HTTPException(status_code=404, detail="没有满足条件的图片")
+    if thumb is not None:
+        items = [render_entry(generation, generation.entries[p], base_url, thumb) for p in positions]
+        return items if count is not None else items[0]
+
+    # 不带缩略图时直接拼接本代预渲染的响应体，不经过逐请求的 JSON 编码
+    base = json.dumps(str(base_url), ensure_ascii=False)[1:-1].encode("utf-8")
+    bodies = [generation.entry_body(p, partial(render_entry_parts, generation), base) for p in positions]
+    content = b"[" + b",".join(bodies) + b"]" if count is not None else bodies[0]
+    return Response(content=content, media_type="application/json")
+
+
+@app.get("/dress/v1/search", summary="按作者、路径前缀、时间筛选图片")
+async def search_images(
+    request: Request,
+    author: AuthorQuery = None,
+    prefix: PrefixQuery = None,
+    after: AfterQuery = None,
+    before: BeforeQuery = None,
+    sort: Annotated[Literal["latest_commit_time", "path"], Query(description="排序方式：latest_commit_time 最新在前，path 按路径")] = "latest_commit_time",
+    offset: Annotated[int, Query(ge=0, description="跳过的图片数")] = 0,
+    limit: Annotated[int, Query(ge=1, le=MAX_SEARCH_PAGE, description="返回的图片数")] = DEFAULT_SEARCH_PAGE,
+    thumb: Annotated[Optional[int], Query(ge=MIN_DERIVATIVE_WIDTH, le=MAX_DERIVATIVE_WIDTH, description="附带该宽度的 WebP 缩略图地址 thumb_url（仅本地模式，需安装 Pillow）")] = None
+):
+    """
+    返回 {"total", "items"}，items 的每项与随机接口的单项相同；不带条件时按 sort 列出全部图片
+    """
+    generation = index_store.current
+    if generation is None:
+        raise HTTPException(status_code=500, detail="本地索引文件不存在")
+    positions = generation.search(entry_filter(author, prefix, after, before), sort)
+    items = [render_entry(generation, generation.entries[p], request.base_url, thumb)
+             for p in positions[offset:offset + limit]]
+    return {"total": len(positions), "items": items}
+
+@app.get("/dress/v1/image", summary="随机跳转到一张可爱男孩子的自拍", status_code=302)
+async def random_image_redirect(
+    request: Request,
+    meta: Annotated[bool, Query(description="在响应头 X-Img-Author / X-Upload-Time 中附带作者与上传时间")] = False,
+    thumb: Annotated[Optional[int], Query(ge=MIN_DERIVATIVE_WIDTH, le=MAX_DERIVATIVE_WIDTH, description="跳转到该宽度的 WebP 缩略图（仅本地模式，需安装 Pillow）")] = None
+):
+    """
+    随机挑选一张图片并 302 跳转到图片地址，可直接用作 <img src>；响应不可缓存，每次访问都重新随机
+    """
+    generation = index_store.current
+    if generation is None:
+        raise HTTPException(status_code=500, detail="本地索引文件不存在")
+    if len(generation) == 0:
+        raise HTTPException(status_code=500, detail="图片索引为空")
+    entry = generation.random_entry()
+    location = entry_image_url(entry, request.base_url)
+    if thumb is not None and minimum_mode != "true" and derivative_cache.available:
+        location = f"{location}?w={thumb}&fmt=webp"
+    headers = {"Location": location, "Cache-Control": "no-store"}
+    if meta:
+        # 响应头只能是 latin-1，作者名按 URL 编码
+        headers["X-Img-Author"] = quote(",".join(entry.author_names(generation.author_table)), safe=",")
+        headers["X-Upload-Time"] = entry.upload_time() or ""
+    return Response(status_code=302, headers=headers)
+
+def sync_job_response(job: SyncJob, **extra) -> JSONResponse:
+    return JSONResponse(
+        status_code=200 if job.finished else 202,
+        content={**job.to_dict(), **extra, "status_url": f"/dress/v1/sync/{job.id}"}
+    )
+
+
+@app.post("/dress/v1/sync", summary="同步远程 Dress 仓库", status_code=202)
 async def sync_dress_repo(
-    background_tasks: BackgroundTasks,
     rebuild_index: bool = Query(...),  # 默认重建索引
+    wait: Annotated[bool, Query(description="等待同步任务结束后再返回")] = False,
     x_api_key: str = Header(None, alias="X-API-Key")  # 必须提供 Header
 ):
     """
     触发服务器拉取 Dress 仓库的最新提交，并重建索引（可选）
+    已有覆盖本次请求的同步任务在运行时并入该任务，返回同一个 job_id；进度见 GET /dress/v1/sync/{job_id}
     """
     if x_api_key != API_KEY:
         raise HTTPException(status_code=403, detail="Invalid API key")
-    if minimum_mode == "true":
-        try:
-            data = await get_github_index()
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"获取远端数据失败: {e}")
-        return {
-            "message": "successfully synced",
-        }
+    if multi_worker and not sync_leader.is_leader:
+        # 只有同步主进程可以拉取和写索引，其余进程把请求转交给它
+        await asyncio.to_thread(request_sync, rebuild_index)
+        return JSONResponse(status_code=202, content={
+            "message": "Sync requested",
+            "note": "The sync leader process will run it shortly; job status is only available on the leader"
+        })
+    job, merged = sync_jobs.submit("manual", pull=True, rebuild_index=rebuild_index)
+    if wait:
+        await job.wait()
+    return sync_job_response(job, merged_into_existing=merged)
 
-    else:
-        # 在后台任务中创建repo实例
-        def sync_task():
-            try:
-                run_git_pull()
-                repo = Repo("Dress")
-                if rebuild_index:
-                    index = build_index(repo)
-                    index = escape_hash_in_index(index, "url")
-                    with open("public/index_0.json", "w", encoding="utf-8") as f:
-                        json.dump(index, f, ensure_ascii=False, indent=4)
-                    
-                    index_by_author = convert_index_id_to_index_author(index)
-                    index_by_author = escape_hash_in_index(index_by_author, "author")
-                    with open("public/index_1.json", "w", encoding="utf-8") as f:
-                        json.dump(index_by_author, f, ensure_ascii=False, indent=4)
-            except FileNotFoundError as e:
-                logging.error(f"Dress目录不存在: {e}")
-            except PermissionError as e:
-                logging.error(f"权限不足: {e}")
-            except Exception as e:
-                logging.error(f"后台同步任务失败: {e}")
-        if force_remote_index == "true":
-            async def remote_sync_task():
-                global data
-                logging.debug("开始执行远程数据同步...")
-                try:
-                    new_data = await get_github_index(index="index_0.json")
-                    data = new_data  # 确保更新全局变量
-                    index_1 = await get_github_index(index="index_1.json")
-                    with open("public/index_0.json", "w", encoding="utf-8") as f:
-                        json.dump(new_data, f, ensure_ascii=False, indent=4)
-                    with open("public/index_1.json", "w", encoding="utf-8") as f:
-                        json.dump(index_1, f, ensure_ascii=False, indent=4)
-                    logging.debug(f"已从GitHub获取最新数据，共{len(new_data)}项数据)")
-                except Exception as e:
-                    logging.error(f"远程数据同步失败: {e}")
-            background_tasks.add_task(remote_sync_task)
-        else:  
-            background_tasks.add_task(sync_task)
-        return {
-            "message": "Sync started in background",
-            "note": "Check server logs for result"
-        }
+
+@app.get("/dress/v1/sync/{job_id}", summary="查询同步任务")
+async def get_sync_job(
+    job_id: Annotated[str, Path(description="POST /dress/v1/sync 返回的 job_id")],
+    x_api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    返回任务的状态、当前阶段、进度（已完成阶段的比例）与耗时
+    """
+    if x_api_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Invalid API key")
+    job = sync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return sync_job_response(job)
+
+
+@app.delete("/dress/v1/sync/{job_id}", summary="取消同步任务")
+async def cancel_sync_job(
+    job_id: Annotated[str, Path(description="POST /dress/v1/sync 返回的 job_id")],
+    x_api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    排队中的任务立即取消；运行中的任务在进入下一阶段时取消，不会打断正在执行的 git pull 或索引写入
+    任务已结束时返回 409
+    """
+    if x_api_key != API_KEY:
+        raise HTTPException(status_code=403, detail="Invalid API key")
+    job = sync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    if job.finished:
+        raise HTTPException(status_code=409, detail=f"Sync job already {job.status}")
+    sync_jobs.cancel(job_id)
+    return sync_job_response(job)
 # 克隆仓库
 
 @app.get("/health", summary="健康检查")
 async def health_check():
-    async with httpx.AsyncClient() as client:
-        # Check GitHub
-        try:
-            resp = await client.get("https://api.github.com", timeout=10.0)
-            github_ok = resp.status_code == 200
-        except httpx.RequestError:
-            github_ok = False
-
-        # Check jsDelivr
-        jsdelivr_ok = False
-        jsdelivr_urls = [
-            "https://cdn.jsdelivr.net/",
-            "https://fastly.jsdelivr.net/",
-            "https://gcore.jsdelivr.net/",
-            "https://testingcf.jsdelivr.net/"
-        ]
-        for url in jsdelivr_urls:
-            try:
-                resp = await client.get(url, timeout=10.0)
-                if resp.status_code in (200, 301):
-                    jsdelivr_ok = True
-                    break
-            except httpx.RequestError:
-                continue  # Try next URL
-
+    """
+    返回后台探测器最近一次的上游连通性结果，不发起外部请求
+    """
     return {
         "status": "healthy",
         "minimum_mode": minimum_mode,
         "auto_sync_enabled": auto_sync_enabled,
         "auto_sync_time": auto_sync_time,
-        "connectivity_to_gitHub": github_ok,
-        "connectivity_to_jsdelivr": jsdelivr_ok
+        "connectivity_to_gitHub": connectivity_prober.status("github"),
+        "connectivity_to_jsdelivr": connectivity_prober.status("jsdelivr"),
+        "connectivity": connectivity_prober.snapshot()
+    }
+
+@app.get("/metrics", summary="Prometheus 指标")
+async def return_metrics():
+    """
+    Prometheus 文本格式的指标：各路由请求数与耗时、索引状态、索引构建与 git 子进程、镜像请求、自动同步
+    """
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/health/ready", summary="就绪检查")
+async def readiness_check():
+    """
+    内存索引已加载且非空时返回 200，否则返回 503
+    """
+    generation = index_store.current
+    if generation is None or len(generation) == 0:
+        return JSONResponse(status_code=503, content={"ready": False})
+    return {
+        "ready": True,
+        "generation": generation.number,
+        "entries": len(generation),
+        "loaded_at": generation.loaded_at
     }
 
+DEFAULT_INDEX_PAGE = 100
+MAX_INDEX_PAGE = 1000
+
+
+def encode_index_cursor(generation: int, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{generation}:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_index_cursor(cursor: str, generation: IndexGeneration) -> int:
+    """解析分页游标，返回起始行号；格式错误返回 400，索引已换代返回 410"""
+    try:
+        number, offset = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split(":")
+        number, offset = int(number), int(offset)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if number != generation.number:
+        raise HTTPException(status_code=410, detail="索引已更新，请从第一页重新开始")
+    return max(0, offset)
+
+
 @app.get("/dress/v1/index/{name}", summary="获取指定索引文件内容")
 async def return_index(
-    name: Annotated[str, Path(description="索引名称，支持 index_0.json 和 index_1.json")]
+    request: Request,
+    name: Annotated[str, Path(description="索引名称，支持 index_0.json 和 index_1.json")],
+    format_: Annotated[Optional[Literal["json", "ndjson"]], Query(alias="format", description="ndjson：每行一个 [key, 条目]，分块传输")] = None,
+    cursor: Annotated[Optional[str], Query(description="上一页返回的 next_cursor")] = None,
+    limit: Annotated[Optional[int], Query(ge=1, le=MAX_INDEX_PAGE, description="每页条数，分页时默认 100")] = None
 ):
     """
-    获取指定索引文件内容
+    获取指定索引文件内容（紧凑 JSON，支持 gzip/br 压缩与 ETag 条件请求）
+    - format=ndjson：逐行流式返回，每行为 [id, 条目]（index_0）或 [作者, 单张图片]（index_1）
+    - cursor / limit：按行分页，返回 {"generation", "total", "items", "next_cursor"}，items 的每项与 NDJSON 的一行相同；
+      游标只在同一代索引内有效，索引更新后返回 410
     """
     if name not in ["index_0.json", "index_1.json"]:
         raise HTTPException(status_code=400, detail="Invalid index name")
-    try:
-        with open(f"public/{name}", "r", encoding="utf-8") as f:
-            index_data = json.load(f)
-        return index_data
-    except FileNotFoundError:
+    generation = index_store.current
+    if generation is None:
         raise HTTPException(status_code=404, detail="Index file not found")
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Index file is corrupted")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading index file: {e}")
+    if format_ != "ndjson" and cursor is None and limit is None:
+        return encoded_response(request, generation.payloads[name])
+
+    start = decode_index_cursor(cursor, generation) if cursor else 0
+    total = generation.line_count(name)
+    if limit is None and format_ != "ndjson":
+        limit = DEFAULT_INDEX_PAGE
+    stop = total if limit is None else min(total, start + limit)
+    next_cursor = encode_index_cursor(generation.number, stop) if stop < total else None
+    headers = {"X-Index-Generation": str(generation.number), "X-Total-Count": str(total)}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    if format_ == "ndjson":
+        return streamed_lines_response(request, generation.iter_lines(name, start, stop), headers)
+    body = b'{"generation":%d,"total":%d,"items":[%b],"next_cursor":%b}' % (
+        generation.number, total, b",".join(generation.iter_lines(name, start, stop)),
+        json.dumps(next_cursor).encode()
+    )
+    return Response(content=body, media_type="application/json", headers=headers)
 @app.get("/dress/v1/author/{author}", summary="获取指定作者的图片信息")
-async def return_author_info(author: Annotated[str, Path(description="作者名称")]):
+async def return_author_info(
+    author: Annotated[str, Path(description="作者名称")],
+    offset: Annotated[int, Query(ge=0, description="跳过的图片数")] = 0,
+    limit: Annotated[Optional[int], Query(ge=1, le=1000, description="返回的图片数，不传则返回全部")] = None,
+    sort: Annotated[Optional[Literal["latest_commit_time", "path"]], Query(description="排序方式：latest_commit_time 最新在前，path 按路径；不传保持索引顺序")] = None
+):
     """
-    获取指定作者的图片信息
+    获取指定作者的图片信息，总数见响应头 X-Total-Count
     """
-    try:
-        with open(f"public/index_1.json", "r", encoding="utf-8") as f:
-            index_authors_data = json.load(f)
-        author_data = index_authors_data[author]
-        return {author: author_data}
-    except KeyError:
+    generation = index_store.current
+    if generation is None:
+        raise HTTPException(status_code=404, detail="Author info not found")
+    author_images = generation.authors.get(author)
+    if author_images is None:
         raise HTTPException(status_code=404, detail="Author not found")
-    except FileNotFoundError:
+    return Response(
+        content=author_images.render(sort, offset, limit),
+        media_type="application/json",
+        headers={"X-Total-Count": str(len(author_images))}
+    )
+@app.get("/dress/v1/authors", summary="获取作者列表及各自的图片数")
+async def return_authors(request: Request):
+    """
+    获取全部作者名称与图片数，按图片数从多到少排列
+    """
+    generation = index_store.current
+    if generation is None:
         raise HTTPException(status_code=404, detail="Author info not found")
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=500, detail="Author info is corrupted")
+    return encoded_response(request, generation.authors_payload)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def resolve_dress_image(path: str) -> p_pathlib:
+    """把 Dress 内的相对路径解析为图片文件，越界、非图片或不存在时返回 404"""
+    source = (DRESS_DIR / path).resolve()
+    if not source.is_relative_to(DRESS_DIR) or source.suffix.lower() not in IMAGE_EXTENSIONS or not source.is_file():
+        raise HTTPException(status_code=404, detail="Not Found")
+    return source
+
+
+async def derivative_response(source: p_pathlib, w: Optional[int], fmt: Optional[str],
+                              headers: dict, blob_sha: Optional[str] = None) -> FileResponse:
+    if not derivative_cache.available:
+        raise HTTPException(status_code=501, detail="未安装 Pillow，无法生成缩略图")
+    fmt = fmt or DEFAULT_FORMATS.get(source.suffix.lower(), "png")
+    try:
+        derivative = await derivative_cache.get(source, w, fmt, blob_sha)
+    except OSError as e:
+        logging.error(f"生成衍生图片失败 ({source}): {e}")
+        raise HTTPException(status_code=500, detail="无法处理该图片")
+    return FileResponse(derivative, media_type=FORMATS[fmt][1], headers=headers)
+
+
+async def return_image(
+    request: Request,
+    path: Annotated[str, Path(description="图片在 Dress 仓库中的相对路径")],
+    w: Annotated[Optional[int], Query(ge=MIN_DERIVATIVE_WIDTH, le=MAX_DERIVATIVE_WIDTH, description="缩放到该宽度（不放大）")] = None,
+    fmt: Annotated[Optional[Literal["webp", "jpeg", "png"]], Query(description="输出格式，不传保持原格式")] = None
+):
+    """
+    获取图片，带 w / fmt 参数时返回缩放或转码后的版本（结果缓存在磁盘），否则返回原图
+    """
+    if w is None and fmt is None:
+        return await dress_static.get_response(path, request.scope)
+    return await derivative_response(resolve_dress_image(path), w, fmt, {"Cache-Control": "public, max-age=86400"})
+
+
+async def return_blob(
+    request: Request,
+    blob: Annotated[str, Path(description="图片的 git blob SHA")],
+    path: Annotated[str, Path(description="图片路径，仅用于文件名")],
+    w: Annotated[Optional[int], Query(ge=MIN_DERIVATIVE_WIDTH, le=MAX_DERIVATIVE_WIDTH, description="缩放到该宽度（不放大）")] = None,
+    fmt: Annotated[Optional[Literal["webp", "jpeg", "png"]], Query(description="输出格式，不传保持原格式")] = None
+):
+    """
+    按内容寻址获取图片：同一 URL 的内容永不改变，可被 CDN 和浏览器永久缓存，支持 Range 请求
+    文件内容已与 URL 中的 blob SHA 不一致（如拉取后尚未重建索引）时返回 404
+    """
+    generation = index_store.current
+    entry = generation.find_blob(blob) if generation is not None else None
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    source = resolve_dress_image(entry.path.replace("%23", "#"))
+    if await asyncio.to_thread(cached_blob_sha, source) != entry.blob_sha:
+        raise HTTPException(status_code=404, detail="Not Found")
+    variant = "" if w is None and fmt is None else f"-w{w or 0}-{fmt or 'orig'}"
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": f'"{entry.blob_sha}{variant}"'}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, [headers["ETag"]]):
+        return Response(status_code=304, headers=headers)
+    if variant:
+        return await derivative_response(source, w, fmt, headers, entry.blob_sha)
+    return FileResponse(source, headers=headers)
 if minimum_mode != "true":
-    app.mount("/img", StaticFiles(directory=BASE_DIR / "Dress"), name="static")
+    DRESS_DIR = (BASE_DIR / "Dress").resolve()
+    dress_static = StaticFiles(directory=DRESS_DIR)
+    app.add_api_route("/blob/{blob}/{path:path}", return_blob, methods=["GET"], summary="按内容寻址获取图片（可永久缓存）")
+    app.add_api_route("/img/{path:path}", return_image, methods=["GET"], summary="获取图片或其缩略图")
+    app.mount("/img", dress_static, name="static")
 app.mount("/", StaticFiles(directory=BASE_DIR / "public", html=True), name="static")
 if __name__ == "__main__":
+    # 索引的构建与远端同步都在服务启动后于后台进行，这里只负责打印横幅并启动服务
+    import colorama
+    from colorama import Fore, Style
 
-    if minimum_mode != "true":
-        repo = Repo("Dress")
-        print("正在检查索引...")
-        if force_remote_index == "true":
-            try:
-                index_id = asyncio.run(get_github_index("index_0.json"))
-                index_author = asyncio.run(get_github_index("index_1.json"))
-                with open("public/index_0.json", "w", encoding="utf-8") as f:
-                    json.dump(index_id, f, ensure_ascii=False, indent=4)
-                with open("public/index_1.json", "w", encoding="utf-8") as f:
-                    json.dump(index_author, f, ensure_ascii=False, indent=4)
-            except Exception as e:
-                logging.error(f"获取远端数据失败: {e}")
-                raise RuntimeError("无法连接到远程服务器获取数据")
-        else:
-            try:
-                if not(os.path.exists("public/index_0.json") and os.path.exists("public/index_1.json")):
-                    index = build_index(repo)
-                    index = escape_hash_in_index(index,"url")
-                    
-                    index_by_author = convert_index_id_to_index_author(index)
-                    index_by_author = escape_hash_in_index(index_by_author,"author")
-                    
-                    with open("public/index_0.json", "w", encoding="utf-8") as f:
-                        json.dump(index,f,ensure_ascii=False,indent=4)
-                    with open("public/index_1.json", "w", encoding="utf-8") as f:
-                        json.dump(index_by_author, f, ensure_ascii=False, indent=4)
-                elif not os.path.exists("public/index_0.json"):
-                    index = build_index(repo)
-                    index = escape_hash_in_index(index,"url")
-                    with open("public/index_0.json", "w", encoding="utf-8") as f:
-                        json.dump(index, f, ensure_ascii=False, indent=4)
-                elif not os.path.exists("public/index_1.json"):
-                    index = build_index_by_author(repo)
-                    index = escape_hash_in_index(index,"author")
-                    with open("public/index_1.json", "w", encoding="utf-8") as f:
-                        json.dump(index, f, ensure_ascii=False, indent=4)
-            except FileNotFoundError as e:
-                print(f"文件未找到: {e}")
-                exit(1)
-            except PermissionError as e:
-                print(f"权限不足: {e}")
-                exit(1)
-            except Exception as e:
-                print(f"构建索引时发生错误: {e}")
-                exit(1)
     colorama.init(autoreset=True)
     print(f"🚀 启动服务: http://0.0.0.0:{ports}")
     print(Fore.LIGHTBLUE_EX+"""
@@ -430,5 +831,9 @@ if __name__ == "__main__":
     # 创建事件循环并同时运行自动同步和web服务器
 
         # 启动web服务器
-    uvicorn.run(app, host="0.0.0.0", port=ports)
+    if multi_worker:
+        # 多进程需要以导入字符串启动，每个工作进程各自导入 main
+        uvicorn.run("main:app", host="0.0.0.0", port=ports, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=ports)
     
\ No newline at end of file
@@ -0,0 +1,281 @@
+"""
+Prometheus 文本格式的指标
+
+不依赖 prometheus_client：计数器、仪表、直方图都是内存里的几个数字，
+/metrics 被抓取时才渲染为文本。指标值的更新只有加法和一次二分查找，
+请求路径上的开销可以忽略
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values) -> object:
+        """按标签值取子指标，同一组标签值总是返回同一个对象，可缓存后重复使用"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+                self._children[values] = child
+        return child
+
+    def _samples(self) -> List[str]:
+        # labels() 会把原始值与字符串值都作为键，渲染时按对象去重
+        seen = set()
+        lines = []
+        for values, child in list(self._children.items()):
+            if id(child) in seen:
+                continue
+            seen.add(id(child))
+            lines.extend(child.render(self.name, self.labelnames, tuple(str(v) for v in values)))
+        return lines
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_label_text(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+    kind = "counter"
+    _new_child = _CounterChild
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_label_text(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    """
+    可任意设置的数值
+    传入 function 时不保存数值，每次抓取时调用它取值（返回 None 则不输出）
+    """
+    kind = "gauge"
+    _new_child = _GaugeChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 function: Optional[Callable[[], Optional[float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def _samples(self) -> List[str]:
+        if self.function is None:
+            return super()._samples()
+        value = self.function()
+        return [] if value is None else [f"{self.name} {_format_value(value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, values):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{name}_bucket{_label_text(labelnames, values, le)} {cumulative}")
+        labels = _label_text(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """按上界分桶的观测值分布，附带总和与次数"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    @contextmanager
+    def time(self, *labels):
+        """计时 with 块并记录到对应标签的子指标，块内抛出异常也会记录"""
+        child = self.labels(*labels)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            child.observe(time.perf_counter() - start)
+
+
+def render() -> bytes:
+    """全部指标的 Prometheus 文本格式"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# ---------------------------------------------------------------- 各模块共用的指标
+
+HTTP_REQUESTS = Counter(
+    "dress_http_requests_total", "HTTP 请求数", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = Histogram(
+    "dress_http_request_duration_seconds", "HTTP 请求处理耗时", ("method", "route"), REQUEST_BUCKETS)
+
+INDEX_BUILD_PHASE_DURATION = Histogram(
+    "dress_index_build_phase_duration_seconds", "索引构建各阶段耗时", ("step", "phase"))
+GIT_SUBPROCESSES = Counter(
+    "dress_git_subprocesses_total", "启动的 git 子进程数", ("command",))
+GIT_SUBPROCESS_SECONDS = Counter(
+    "dress_git_subprocess_seconds_total", "git 子进程累计运行时间", ("command",))
+
+GIT_PULL_DURATION = Histogram("dress_git_pull_duration_seconds", "git pull 耗时")
+GIT_PULLS = Counter("dress_git_pulls_total", "git pull 次数", ("outcome",))
+
+MIRROR_REQUEST_DURATION = Histogram(
+    "dress_mirror_request_duration_seconds", "远端镜像请求耗时（仅成功的请求）", ("mirror",))
+MIRROR_FAILURES = Counter("dress_mirror_failures_total", "远端镜像请求失败次数", ("mirror",))
+
+AUTO_SYNC_DURATION = Histogram("dress_auto_sync_duration_seconds", "每轮自动同步耗时")
+AUTO_SYNC_RUNS = Counter("dress_auto_sync_runs_total", "自动同步轮数", ("outcome",))
+AUTO_SYNC_LAST_SUCCESS = Gauge(
+    "dress_auto_sync_last_success_timestamp_seconds", "最近一次自动同步成功的时间")
+
+SYNC_JOBS = Counter("dress_sync_jobs_total", "结束的同步任务数", ("trigger", "status"))
+
+ADMISSION_QUEUE_WAIT = Histogram(
+    "dress_admission_queue_wait_seconds", "准入控制中排队等待的时间（仅被放行的请求）", ("limit",), REQUEST_BUCKETS)
+ADMISSION_REJECTED = Counter(
+    "dress_admission_rejected_total", "被准入控制或限流拒绝的请求数", ("limit", "reason"))
+
+
+@contextmanager
+def track_git(command: str):
+    """统计一次 git 子进程：次数与运行时间按子命令累计"""
+    GIT_SUBPROCESSES.labels(command).inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        GIT_SUBPROCESS_SECONDS.labels(command).inc(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """
+    纯 ASGI 中间件，按路由模板（而非实际路径）统计请求数与耗时，避免标签基数随路径增长
+    没有匹配到 API 路由的请求按挂载点归类，如 /img/{path}
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # 路由匹配后 scope 里会带上 route（API 路由）或 endpoint（挂载的静态目录）
+            route = scope.get("route")
+            if route is not None:
+                name = getattr(route, "path", "other")
+            elif "endpoint" in scope:
+                name = scope.get("root_path", "")[len(scope.get("app_root_path", "")):] + "/{path}"
+            else:
+                name = "unmatched"
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.labels(method, name).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, name, status).inc()
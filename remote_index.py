@@ -0,0 +1,212 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import httpx
+
+from metrics import MIRROR_FAILURES, MIRROR_REQUEST_DURATION
+
+JSDELIVR_MIRRORS = [
+    "https://cdn.jsdelivr.net/",
+    "https://fastly.jsdelivr.net/",
+    "https://gcore.jsdelivr.net/",
+    "https://testingcf.jsdelivr.net/"
+]
+REMOTE_INDEX_PATH = "gh/nomdn/dress-api@main/public/"
+REMOTE_MIRRORS = [url.strip() for url in (os.environ.get("REMOTE_MIRRORS") or "").split(",") if url.strip()] or JSDELIVR_MIRRORS
+REMOTE_TIMEOUT = float(os.environ.get("REMOTE_TIMEOUT") or 10)
+REMOTE_HEDGE_DELAY = float(os.environ.get("REMOTE_HEDGE_DELAY") or 0.5)
+
+# 延迟的指数滑动平均系数
+_EWMA_ALPHA = 0.3
+
+
+class MirrorFetcher:
+    """
+    共享连接池的镜像请求器，对冲（hedged）请求多个镜像
+    - 按历史延迟从快到慢排序，先请求最快的镜像
+    - hedge_delay 秒内没有结果（或当前镜像失败）就再启动下一个镜像，先成功者胜出，其余取消
+    - 每个镜像记录成功延迟的滑动平均，失败按 timeout 计入
+    状态码 < 400（含 304）视为成功
+    """
+
+    def __init__(self, mirrors: Sequence[str] = REMOTE_MIRRORS, timeout: float = REMOTE_TIMEOUT,
+                 hedge_delay: float = REMOTE_HEDGE_DELAY, client: Optional[httpx.AsyncClient] = None):
+        self.mirrors: List[str] = [url if url.endswith("/") else url + "/" for url in mirrors]
+        self.timeout = timeout
+        self.hedge_delay = hedge_delay
+        self.latencies: Dict[str, Optional[float]] = {url: None for url in self.mirrors}
+        self._client = client
+        self._owns_client = client is None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # 连接池绑定事件循环：首次请求时在当前循环（服务的 lifespan 所在的循环）中创建，退出时由 aclose 关闭
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=len(self.mirrors))
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._owns_client and self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    def ranked(self) -> List[str]:
+        """按延迟排序的镜像列表；尚未测过的镜像按 hedge_delay 估计，保持配置顺序"""
+        def key(url):
+            latency = self.latencies[url]
+            return self.hedge_delay if latency is None else latency
+        return sorted(self.mirrors, key=key)
+
+    def _record(self, url: str, latency: float):
+        previous = self.latencies[url]
+        self.latencies[url] = latency if previous is None else previous + _EWMA_ALPHA * (latency - previous)
+
+    async def _attempt(self, client: httpx.AsyncClient, url: str, path: str,
+                       headers: Optional[Dict[str, str]]) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            response = await client.get(url + path, headers=headers, timeout=self.timeout)
+            if response.status_code >= 400:
+                raise httpx.HTTPStatusError(
+                    f"{response.status_code} {response.reason_phrase}",
+                    request=response.request, response=response
+                )
+        except (httpx.TimeoutException, httpx.RequestError, httpx.HTTPStatusError):
+            # 被取消的落选请求不会走到这里，只有真正的失败计入惩罚
+            self._record(url, self.timeout)
+            MIRROR_FAILURES.labels(url).inc()
+            raise
+        latency = loop.time() - start
+        self._record(url, latency)
+        MIRROR_REQUEST_DURATION.labels(url).observe(latency)
+        return response
+
+    async def fetch(self, path: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        请求 <mirror>/<path>，返回最先成功的响应
+        全部镜像失败时抛出 RuntimeError
+        """
+        client = self._get_client()
+        remaining = self.ranked()
+        pending: Dict[asyncio.Task, str] = {}
+        try:
+            while remaining or pending:
+                if remaining:
+                    url = remaining.pop(0)
+                    pending[asyncio.create_task(self._attempt(client, url, path, headers))] = url
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_delay if remaining else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                failed = []
+                for task in done:
+                    url = pending.pop(task)
+                    if task.exception() is None:
+                        logging.debug(f"远端请求命中 {url}{path}")
+                        return task.result()
+                    failed.append((url, task.exception()))
+                for url, e in failed:
+                    logging.warning(f"镜像请求失败 {url}{path}: {e!r}")
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        raise RuntimeError("获取远端数据失败！")
+
+
+remote_fetcher = MirrorFetcher()
+
+
+REMOTE_CACHE_DIR = os.environ.get("REMOTE_CACHE_DIR") or "cache/remote"
+REMOTE_INDEX_FILES = ("index_0.json", "index_1.json")
+_VALIDATORS_FILE = "validators.json"
+
+
+class RemoteIndexCache:
+    """
+    远端索引的磁盘缓存，同步时使用条件请求
+    - 原始响应体存为 <cache_dir>/<name>，ETag / Last-Modified 存在 validators.json
+    - refresh 携带 If-None-Match / If-Modified-Since，远端返回 304 时不下载、不解析、不写盘
+    启动时可先用 load 读出缓存提供服务，再在后台 refresh
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = REMOTE_CACHE_DIR, fetcher: Optional[MirrorFetcher] = None):
+        self.cache_dir = Path(cache_dir)
+        self.fetcher = fetcher
+        self._validators: Dict[str, Dict[str, str]] = self._read_validators()
+        self._lock = threading.Lock()
+
+    def _read_validators(self) -> Dict[str, Dict[str, str]]:
+        try:
+            with open(self.cache_dir / _VALIDATORS_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, name: str, body: bytes, validators: Dict[str, str]):
+        # 两个索引并发刷新时共用 validators.json，串行写入
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_dir / f"{name}.tmp"
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, self.cache_dir / name)
+            self._validators[name] = validators
+            tmp_path = self.cache_dir / f"{_VALIDATORS_FILE}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._validators, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.cache_dir / _VALIDATORS_FILE)
+
+    def read(self, name: str) -> Optional[bytes]:
+        try:
+            return (self.cache_dir / name).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def load(self, names: Sequence[str] = REMOTE_INDEX_FILES) -> List[Dict]:
+        """解析缓存中的索引文件；缺失时抛出 FileNotFoundError，损坏时抛出 json.JSONDecodeError"""
+        result = []
+        for name in names:
+            with open(self.cache_dir / name, "r", encoding="utf-8") as f:
+                result.append(json.load(f))
+        return result
+
+    async def refresh(self, name: str) -> bool:
+        """条件请求远端索引并更新缓存，返回内容是否变化；远端返回无效 JSON 时抛出 ValueError"""
+        cached = await asyncio.to_thread(self.read, name)
+        validators = self._validators.get(name, {}) if cached is not None else {}
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        response = await (self.fetcher or remote_fetcher).fetch(f"{REMOTE_INDEX_PATH}{name}", headers=headers)
+        if response.status_code == 304:
+            logging.debug(f"远端 {name} 未变化 (304)")
+            return False
+        body = response.content
+        new_validators = {
+            key: response.headers[header]
+            for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified"))
+            if header in response.headers
+        }
+        if body == cached:
+            if new_validators != validators:
+                await asyncio.to_thread(self._write, name, body, new_validators)
+            return False
+        # 先确认是完整的 JSON 再落盘，避免缓存半截响应
+        json.loads(body)
+        await asyncio.to_thread(self._write, name, body, new_validators)
+        logging.info(f"远端 {name} 已更新，{len(body)} 字节")
+        return True
+
+
+remote_cache = RemoteIndexCache()
@@ -0,0 +1,102 @@
+"""
+多进程部署时在进程之间共享索引
+
+同步主进程每发布一代索引，就把预编码的响应体、二进制索引与作者图片表写进 <shared_dir>/<token>/，
+最后原子替换 <shared_dir>/current.json 指向这一代。其他进程轮询 current.json，
+mmap 这些文件组装出 IndexGeneration，同一份数据只占一份页缓存，切换到新一代时也不需要解析任何 JSON。
+旧目录保留上一代，正在使用的映射即使目录被删除也仍然有效。
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from index_binary import BinaryIndex, write_binary_index
+from index_store import EncodedPayload, IndexGeneration, build_authors, encode_author_images, map_author_images
+
+SHARED_INDEX_DIR = os.environ.get("SHARED_INDEX_DIR") or "cache/shared"
+MANIFEST_FILE = "current.json"
+# 共享的响应体：文件名 → IndexGeneration 上的来源
+SHARED_PAYLOADS = ("index_0.json", "index_1.json", "authors.json")
+AUTHORS_FILE = "authors.bin"
+KEEP_GENERATIONS = 2
+
+
+def _payload_of(generation: IndexGeneration, name: str) -> EncodedPayload:
+    return generation.authors_payload if name == "authors.json" else generation.payloads[name]
+
+
+def read_manifest(shared_dir: Union[str, Path] = SHARED_INDEX_DIR) -> Optional[Dict]:
+    try:
+        with open(Path(shared_dir) / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_shared_generation(generation: IndexGeneration, shared_dir: Union[str, Path] = SHARED_INDEX_DIR) -> str:
+    """把一代索引写成共享文件并更新 current.json，返回这一代的 token"""
+    shared_dir = Path(shared_dir)
+    token = f"{int(generation.loaded_at * 1000)}-{generation.number}"
+    gen_dir = shared_dir / token
+    gen_dir.mkdir(parents=True, exist_ok=True)
+    payloads = {}
+    for name in SHARED_PAYLOADS:
+        payload = _payload_of(generation, name)
+        for encoding, body in payload.bodies.items():
+            (gen_dir / f"{name}.{encoding}").write_bytes(body)
+        payloads[name] = {"etags": payload.etags}
+    write_binary_index(generation.to_index_0(), gen_dir / "index_0.bin")
+    (gen_dir / AUTHORS_FILE).write_bytes(encode_author_images(generation.authors))
+
+    manifest = {
+        "token": token,
+        "number": generation.number,
+        "loaded_at": generation.loaded_at,
+        "payloads": payloads,
+    }
+    tmp_path = shared_dir / f"{MANIFEST_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, shared_dir / MANIFEST_FILE)
+
+    # 只保留最近几代，其余目录删除（已映射的进程不受影响）
+    old_dirs = sorted(
+        (p for p in shared_dir.iterdir() if p.is_dir() and p.name != token),
+        key=lambda p: p.stat().st_mtime, reverse=True
+    )
+    for old in old_dirs[KEEP_GENERATIONS - 1:]:
+        shutil.rmtree(old, ignore_errors=True)
+    logging.info(f"已写出共享索引: 第 {generation.number} 代 ({token})")
+    return token
+
+
+def _map_file(path: Path) -> memoryview:
+    with open(path, "rb") as f:
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def load_shared_generation(manifest: Dict, shared_dir: Union[str, Path] = SHARED_INDEX_DIR) -> IndexGeneration:
+    """
+    按 manifest 映射共享文件组装一代索引；文件缺失时抛出 FileNotFoundError
+    旧版本主进程写出的一代没有作者图片表，此时在这里（工作线程中）由 index_1 构建
+    """
+    gen_dir = Path(shared_dir) / manifest["token"]
+    loaded_at = manifest.get("loaded_at") or time.time()
+    payloads = {}
+    for name in SHARED_PAYLOADS:
+        etags = manifest["payloads"][name]["etags"]
+        bodies = {encoding: _map_file(gen_dir / f"{name}.{encoding}") for encoding in etags}
+        payloads[name] = EncodedPayload.from_encoded(bodies, etags, loaded_at)
+    authors_payload = payloads.pop("authors.json")
+    if (gen_dir / AUTHORS_FILE).exists():
+        authors = map_author_images(_map_file(gen_dir / AUTHORS_FILE))
+    else:
+        authors = build_authors(json.loads(bytes(payloads["index_1.json"].bodies["identity"])))
+    return IndexGeneration.from_shared(
+        manifest["number"], BinaryIndex(gen_dir / "index_0.bin"), payloads, authors_payload, authors, loaded_at
+    )
@@ -0,0 +1,201 @@
+"""
+同步任务管理
+
+同一时刻只运行一个同步任务（git pull + 重建索引，或刷新远端索引），避免两个同步在同一个仓库上并发拉取、
+并发写 public/index_*.json：
+- 新请求被运行中的任务覆盖（不需要它没做的步骤）、且该任务还没开始拉取或读取新数据时，直接并入该任务，
+  返回同一个任务 ID；已经开始的任务可能看不到触发这次请求的新提交，不能并入
+- 否则排入唯一一个后续任务，之后的请求都并入它，运行中的任务结束后再执行
+- 任务记录阶段、进度与耗时，可按 ID 查询；取消在阶段之间生效，不会打断正在执行的 git 或写文件
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from metrics import SYNC_JOBS
+
+# 保留的已结束任务数，更早的任务查询时返回 404
+SYNC_JOB_HISTORY = int(os.environ.get("SYNC_JOB_HISTORY") or 20)
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class SyncCancelled(Exception):
+    """任务在阶段之间被取消"""
+
+
+class SyncJob:
+    """
+    一次同步任务
+    - pull: 是否先 git pull；rebuild_index: 是否重建本地索引
+    - status: queued / running / succeeded / failed / cancelled
+    - phases: 本任务要执行的阶段，由执行函数在开始时填写；phase 为当前阶段
+    """
+    __slots__ = ("id", "trigger", "pull", "rebuild_index", "status", "phases", "phase", "completed_phases",
+                 "merged", "error", "cancel_requested", "created_at", "started_at", "finished_at", "_done")
+
+    def __init__(self, trigger: str, pull: bool, rebuild_index: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.trigger = trigger
+        self.pull = pull
+        self.rebuild_index = rebuild_index
+        self.status = "queued"
+        self.phases: List[str] = []
+        self.phase: Optional[str] = None
+        self.completed_phases = 0
+        self.merged = 0
+        self.error: Optional[str] = None
+        self.cancel_requested = False
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def covers(self, pull: bool, rebuild_index: bool) -> bool:
+        """本任务是否已包含请求的全部步骤"""
+        return (self.pull or not pull) and (self.rebuild_index or not rebuild_index)
+
+    def can_absorb(self, pull: bool, rebuild_index: bool) -> bool:
+        """
+        请求能否并入本任务：步骤已覆盖，且结果还能反映请求时仓库的状态
+        需要拉取的请求只能并入还没开始拉取的任务；不拉取的请求在任务读取仓库或远端（拉取之后的阶段）前都可并入
+        """
+        if self.cancel_requested or not self.covers(pull, rebuild_index):
+            return False
+        return self.phase is None or (not pull and self.phase == "pull")
+
+    def enter(self, phase: str):
+        """进入下一阶段；已请求取消时抛出 SyncCancelled"""
+        if self.cancel_requested:
+            raise SyncCancelled()
+        if self.phase is not None:
+            self.completed_phases += 1
+        self.phase = phase
+
+    async def wait(self):
+        await self._done.wait()
+
+    def to_dict(self) -> Dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "trigger": self.trigger,
+            "pull": self.pull,
+            "rebuild_index": self.rebuild_index,
+            "status": self.status,
+            "phase": self.phase,
+            "phases": self.phases,
+            "progress": round(self.completed_phases / len(self.phases), 3) if self.phases else None,
+            "merged_requests": self.merged,
+            "cancel_requested": self.cancel_requested,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration": round(end - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class SyncJobManager:
+    """
+    单飞的同步任务调度，runner(job) 执行实际的同步并在各阶段开始时调用 job.enter(阶段)
+    只在事件循环中调用，不需要加锁
+    """
+
+    def __init__(self, runner: Callable[[SyncJob], Awaitable[None]], history: int = SYNC_JOB_HISTORY):
+        self.runner = runner
+        self.history = history
+        self.jobs: "OrderedDict[str, SyncJob]" = OrderedDict()
+        self.running: Optional[SyncJob] = None
+        self.pending: Optional[SyncJob] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, job_id: str) -> Optional[SyncJob]:
+        return self.jobs.get(job_id)
+
+    def submit(self, trigger: str, pull: bool = True, rebuild_index: bool = True) -> Tuple[SyncJob, bool]:
+        """提交同步请求，返回 (任务, 是否并入了已有任务)"""
+        running = self.running
+        if running is not None and running.can_absorb(pull, rebuild_index):
+            running.merged += 1
+            return running, True
+        if self.pending is not None:
+            self.pending.pull |= pull
+            self.pending.rebuild_index |= rebuild_index
+            self.pending.merged += 1
+            return self.pending, True
+        job = SyncJob(trigger, pull, rebuild_index)
+        self._remember(job)
+        if running is None:
+            self._start(job)
+        else:
+            self.pending = job
+        return job, False
+
+    def cancel(self, job_id: str) -> Optional[SyncJob]:
+        """取消任务：排队中的直接取消，运行中的在进入下一阶段时取消；任务不存在时返回 None"""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        if job is self.pending:
+            self.pending = None
+            self._finish(job, "cancelled")
+        else:
+            job.cancel_requested = True
+        return job
+
+    def shutdown(self):
+        self.pending = None
+        if self._task is not None:
+            self._task.cancel()
+
+    def _remember(self, job: SyncJob):
+        self.jobs[job.id] = job
+        finished = [job_id for job_id, j in self.jobs.items() if j.finished]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    def _start(self, job: SyncJob):
+        self.running = job
+        self._task = asyncio.create_task(self._run(job))
+
+    def _finish(self, job: SyncJob, status: str):
+        job.status = status
+        job.finished_at = time.time()
+        if status == "succeeded":
+            job.completed_phases = len(job.phases)
+        SYNC_JOBS.labels(job.trigger, status).inc()
+        job._done.set()
+
+    async def _run(self, job: SyncJob):
+        job.status = "running"
+        job.started_at = time.time()
+        logging.info(f"同步任务 {job.id} 开始（{job.trigger}）")
+        status = "failed"
+        try:
+            await self.runner(job)
+            status = "succeeded"
+        except SyncCancelled:
+            status = "cancelled"
+        except asyncio.CancelledError:
+            # 服务退出
+            status = "cancelled"
+            raise
+        except Exception as e:
+            job.error = str(e)
+            logging.error(f"同步任务 {job.id} 失败: {e}")
+        finally:
+            self._finish(job, status)
+            self.running = None
+            logging.info(f"同步任务 {job.id} 结束: {status}，耗时 {job.to_dict()['duration']} 秒")
+            if self.pending is not None:
+                next_job, self.pending = self.pending, None
+                self._start(next_job)
@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，此时每个进程都视为主进程，只应单进程运行
+    fcntl = None
+
+SYNC_LOCK_FILE = os.environ.get("SYNC_LOCK_FILE") or "cache/sync.lock"
+SYNC_REQUEST_FILE = os.environ.get("SYNC_REQUEST_FILE") or "cache/sync_request.json"
+
+
+class SyncLeader:
+    """
+    用文件锁在多个工作进程中选出唯一的同步主进程
+    持有锁的进程负责 git pull、重建索引和写共享文件；进程退出时锁自动释放，
+    其他进程下次 try_acquire 即可接替
+    """
+
+    def __init__(self, lock_path: Union[str, Path] = SYNC_LOCK_FILE):
+        self.lock_path = Path(lock_path)
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """非阻塞地尝试获取锁，已是主进程时直接返回 True"""
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
+
+
+def request_sync(rebuild_index: bool, path: Union[str, Path] = SYNC_REQUEST_FILE):
+    """非主进程收到同步请求时写入请求文件，由主进程下次轮询时执行"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    previous = take_sync_request(path) or {}
+    tmp_path = Path(f"{path}.tmp.{os.getpid()}")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        # 多次请求合并，任一请求需要重建就重建
+        json.dump({"rebuild_index": rebuild_index or bool(previous.get("rebuild_index"))}, f)
+    os.replace(tmp_path, path)
+
+
+def take_sync_request(path: Union[str, Path] = SYNC_REQUEST_FILE) -> Optional[Dict]:
+    """取出并删除待处理的同步请求，没有时返回 None"""
+    path = Path(path)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            request = json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError as e:
+        logging.warning(f"同步请求文件格式错误: {e}")
+        request = {}
+    path.unlink(missing_ok=True)
+    return request